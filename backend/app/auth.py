@@ -0,0 +1,138 @@
+# Resolves the calling user (principal) for protected endpoints, backed by the principal cache
+# (in-process, or shared between workers with CACHE_BACKEND=redis)
+import os
+import threading
+from typing import List, NamedTuple
+
+from fastapi import Depends, HTTPException, Query, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+from .cache import MISSING, make_cache
+from .database import get_async_db, get_db
+
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "4096"))
+
+
+# identity and role of the calling user, safe to share between requests and sessions
+class Principal(NamedTuple):
+    user_id: int
+    username: str
+    full_name: str
+    email: str
+    role: str
+
+
+principal_cache = make_cache(
+    "principal", PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL, decode=lambda value: Principal(*value)
+)
+
+# per-endpoint hit/miss counters, keyed by route path
+_counters = {}
+_counters_lock = threading.Lock()
+
+
+def _count(endpoint: str, hit: bool):
+    with _counters_lock:
+        counter = _counters.setdefault(endpoint, {"hits": 0, "misses": 0})
+        counter["hits" if hit else "misses"] += 1
+
+
+# return principal for user_id from cache or database, None if the user does not exist
+def lookup_principal(db: Session, user_id: int, endpoint: str = "unknown"):
+    principal = principal_cache.get(user_id)
+    if principal is not MISSING:
+        _count(endpoint, True)
+        return principal
+
+    _count(endpoint, False)
+    return _store_principal(user_id, db.execute(_principal_select(user_id)).first())
+
+
+# async version of lookup_principal for AsyncSession, the cache is read and filled without
+# blocking the event loop
+async def lookup_principal_async(db: AsyncSession, user_id: int, endpoint: str = "unknown"):
+    principal = await principal_cache.get_async(user_id)
+    if principal is not MISSING:
+        _count(endpoint, True)
+        return principal
+
+    _count(endpoint, False)
+    row = (await db.execute(_principal_select(user_id))).first()
+    if not row:
+        return None
+    principal = Principal(*row)
+    await principal_cache.set_async(user_id, principal)
+    return principal
+
+
+def _principal_select(user_id: int):
+    return select(
+        models.User.user_id, models.User.username, models.User.full_name,
+        models.User.email, models.User.role
+    ).where(models.User.user_id == user_id)
+
+
+def _store_principal(user_id: int, row):
+    if not row:
+        return None
+    principal = Principal(*row)
+    principal_cache.set(user_id, principal)
+    return principal
+
+
+# drop a cached principal, must be called whenever a user is deleted or their role changes
+def invalidate_principal(user_id: int):
+    principal_cache.invalidate(user_id)
+
+
+# function to check user permissions based on role
+def check_permission(current_user: Principal, allowed_roles: List[str]):
+    if current_user.role not in allowed_roles:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+
+# FastAPI dependency resolving the requesting user from the user_id query parameter
+def get_principal(
+    request: Request,
+    user_id: int = Query(..., description="Requesting user's user_id"),
+    db: Session = Depends(get_db)
+) -> Principal:
+    principal = lookup_principal(db, user_id, _endpoint(request))
+    if not principal:
+        raise HTTPException(status_code=401, detail="User not found")
+    return principal
+
+
+# async version of get_principal, used by the async routes when DB_ASYNC is enabled
+async def get_principal_async(
+    request: Request,
+    user_id: int = Query(..., description="Requesting user's user_id"),
+    db: AsyncSession = Depends(get_async_db)
+) -> Principal:
+    principal = await lookup_principal_async(db, user_id, _endpoint(request))
+    if not principal:
+        raise HTTPException(status_code=401, detail="User not found")
+    return principal
+
+
+def _endpoint(request: Request) -> str:
+    route = request.scope.get("route")
+    path = route.path if route is not None else request.url.path
+    return f"{request.method} {path}"
+
+
+# snapshot of cache size and per-endpoint hit rates
+def principal_cache_stats():
+    with _counters_lock:
+        endpoints = {}
+        for endpoint, counter in _counters.items():
+            total = counter["hits"] + counter["misses"]
+            endpoints[endpoint] = {
+                **counter,
+                "hit_rate": round(counter["hits"] / total, 4) if total else 0.0
+            }
+    return {"size": len(principal_cache), "ttl": principal_cache.ttl, "endpoints": endpoints}
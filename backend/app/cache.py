@@ -0,0 +1,280 @@
+# Caches shared by the API.
+# CACHE_BACKEND=memory (default) keeps entries and version counters in the process, which is
+# right for a single worker. With several workers use CACHE_BACKEND=redis: entries and
+# counters then live in a Redis-compatible server (REDIS_URL), so an invalidation or a
+# version bump in one worker is seen by all of them. make_cache() and make_counter() pick
+# the implementation; every cache has the TTLCache interface (get/set/invalidate/clear/len),
+# plus get_async/set_async for the async routes, which go through redis.asyncio on Redis.
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import Request, Response
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# prefix of every key, so several deployments can share one Redis database
+CACHE_PREFIX = os.getenv("CACHE_PREFIX", "grade_api:")
+
+# sentinel returned by TTLCache.get on a miss, so cached None values are still hits
+MISSING = object()
+
+
+# thread-safe LRU cache whose entries expire ttl seconds after they are set
+class TTLCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    # in memory there is nothing to wait for
+    async def get_async(self, key):
+        return self.get(key)
+
+    async def set_async(self, key, value):
+        self.set(key, value)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# Redis-backed cache with the TTLCache interface; values are stored as JSON and passed
+# through decode on the way out (e.g. to rebuild a NamedTuple). The async variants use
+# async_client, async_redis_client() unless given.
+class RedisCache:
+    def __init__(self, client, namespace: str, ttl: float = 60.0, decode=None, async_client=None):
+        self.client = client
+        self.async_client = async_client
+        self.namespace = namespace
+        self.ttl = ttl
+        self.decode = decode
+
+    def _key(self, key):
+        return f"{self.namespace}{key}"
+
+    def _load(self, raw):
+        if raw is None:
+            return MISSING
+        value = json.loads(raw)
+        return self.decode(value) if self.decode is not None and value is not None else value
+
+    def get(self, key):
+        return self._load(self.client.get(self._key(key)))
+
+    def set(self, key, value):
+        self.client.set(self._key(key), json.dumps(value), px=int(self.ttl * 1000))
+
+    async def get_async(self, key):
+        return self._load(await _async(self).get(self._key(key)))
+
+    async def set_async(self, key, value):
+        await _async(self).set(self._key(key), json.dumps(value), px=int(self.ttl * 1000))
+
+    def invalidate(self, key):
+        self.client.delete(self._key(key))
+
+    def clear(self):
+        for key in self.client.scan_iter(match=f"{self.namespace}*"):
+            self.client.delete(key)
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(match=f"{self.namespace}*"))
+
+
+# process-local version counter
+class LocalCounter:
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def get(self) -> int:
+        return self._value
+
+    async def get_async(self) -> int:
+        return self._value
+
+    def incr(self) -> int:
+        with self._lock:
+            self._value += 1
+            return self._value
+
+
+# version counter shared through Redis
+class RedisCounter:
+    def __init__(self, client, key: str, async_client=None):
+        self.client = client
+        self.async_client = async_client
+        self.key = key
+
+    def get(self) -> int:
+        return int(self.client.get(self.key) or 0)
+
+    async def get_async(self) -> int:
+        return int(await _async(self).get(self.key) or 0)
+
+    def incr(self) -> int:
+        return self.client.incr(self.key)
+
+
+_redis_client = None
+
+
+# Redis client for REDIS_URL, created on first use (redis-py connects lazily)
+def redis_client():
+    global _redis_client
+    if _redis_client is None:
+        import redis  # optional dependency, only needed with CACHE_BACKEND=redis
+        _redis_client = redis.Redis.from_url(REDIS_URL)
+    return _redis_client
+
+
+# use client (any object with the redis-py get/set/delete/incr/scan_iter/ping methods,
+# e.g. a fake in tests) instead of connecting to REDIS_URL; call before the app is imported
+def set_redis_client(client):
+    global _redis_client
+    _redis_client = client
+
+
+_async_redis_client = None
+
+
+# redis.asyncio client for REDIS_URL, for callers on the event loop (async routes, the rate limiter)
+def async_redis_client():
+    global _async_redis_client
+    if _async_redis_client is None:
+        import redis.asyncio  # optional dependency, only needed with a Redis backend
+        _async_redis_client = redis.asyncio.Redis.from_url(REDIS_URL)
+    return _async_redis_client
+
+
+# use client (any object with the redis.asyncio get/set/register_script methods) instead of
+# connecting to REDIS_URL; call before the app is imported
+def set_async_redis_client(client):
+    global _async_redis_client
+    _async_redis_client = client
+
+
+# async client of a RedisCache or RedisCounter, created on first use so it binds to the
+# event loop that serves requests
+def _async(owner):
+    if owner.async_client is None:
+        owner.async_client = async_redis_client()
+    return owner.async_client
+
+
+# cache for namespace on the configured backend
+def make_cache(namespace: str, maxsize: int, ttl: float, decode=None):
+    if CACHE_BACKEND == "redis":
+        return RedisCache(redis_client(), f"{CACHE_PREFIX}{namespace}:", ttl, decode)
+    return TTLCache(maxsize=maxsize, ttl=ttl)
+
+
+# version counter called name on the configured backend
+def make_counter(name: str):
+    if CACHE_BACKEND == "redis":
+        return RedisCounter(redis_client(), f"{CACHE_PREFIX}{name}:version")
+    return LocalCounter()
+
+
+# True when the cache backend is reachable, used by the readiness check
+def ping() -> bool:
+    if CACHE_BACKEND == "redis":
+        return bool(redis_client().ping())
+    return True
+
+
+# single cached value tied to a version counter, reloaded on the next read after bump();
+# with a shared counter every worker reloads after a bump in any of them
+class VersionedValue:
+    def __init__(self, counter=None):
+        self.counter = counter if counter is not None else LocalCounter()
+        self._value = MISSING
+        self._value_version = -1
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> int:
+        return self.counter.get()
+
+    def bump(self):
+        self.counter.incr()
+
+    # return (version, value), value is MISSING when it has to be (re)loaded for that version
+    def peek(self):
+        return self._cached(self.counter.get())
+
+    # peek for the event loop, reading a shared counter through redis.asyncio
+    async def peek_async(self):
+        return self._cached(await self.counter.get_async())
+
+    def _cached(self, version):
+        with self._lock:
+            if self._value_version == version:
+                return version, self._value
+            return version, MISSING
+
+    # store a value loaded for version, a bump during the load leaves it stale for the next read
+    def store(self, version, value):
+        with self._lock:
+            if version >= self._value_version:
+                self._value = value
+                self._value_version = version
+
+    # return the cached value, calling loader() when it is missing or stale
+    def get(self, loader):
+        version, value = self.peek()
+        if value is MISSING:
+            # load outside the lock
+            value = loader()
+            self.store(version, value)
+        return value
+
+
+# strong ETag over the repr of the given parts
+def compute_etag(*parts) -> str:
+    return '"' + hashlib.sha1(repr(parts).encode()).hexdigest() + '"'
+
+
+# True when the request's If-None-Match header already names etag
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [c.strip().removeprefix("W/") for c in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+# 304 response carrying the current ETag
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
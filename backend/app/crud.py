@@ -1,20 +1,42 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from . import models
+from sqlalchemy import and_, delete, func, select, update
+from datetime import datetime
+from typing import NamedTuple
+from . import models, security, stats
+from .auth import invalidate_principal
+from .cache import VersionedValue, compute_etag, make_counter
 
 from sqlalchemy import or_, and_
 
 # User CRUD Operations for authentication and management
+
+# columns needed to log a user in, loaded without building an ORM object
+def _login_select(column, login: str):
+    return select(
+        models.User.user_id, models.User.username, models.User.full_name,
+        models.User.email, models.User.role, models.User.password
+    ).where(column == login)
+
+def get_user_by_login(db: Session, login: str):
+    # two single-column lookups so each one can use its unique index, unlike an OR across both
+    user = db.execute(_login_select(models.User.username, login)).first()
+    if user is None and '@' in login:
+        user = db.execute(_login_select(models.User.email, login)).first()
+    return user
+
+# fetch user by username or email and verify the password
 def get_user_by_credentials(db: Session, login: str, password: str):
-    user = (
-        db.query(models.User)
-        .filter(
-            (models.User.username == login) | (models.User.email == login),
-            models.User.password == password
-        )
-        .first()
+    user = get_user_by_login(db, login)
+    if user and security.verify_password(password, user.password):
+        return user
+    return None
+
+# replace a user's stored password hash
+def set_user_password(db: Session, user_id: int, password_hash: str):
+    db.query(models.User).filter(models.User.user_id == user_id).update(
+        {models.User.password: password_hash}, synchronize_session=False
     )
-    return user
+    db.commit()
 
 #create new user
 def create_user(db: Session, user): 
@@ -23,7 +45,7 @@ def create_user(db: Session, user):
         email=user.email,
         role=user.role,
         username=user.username,
-        password=user.password
+        password=security.hash_password(user.password)
     )
     db.add(user)
     db.commit()
@@ -38,19 +60,54 @@ def get_user_by_email(db: Session, email: str):
 def get_all_students(db: Session):
     return db.query(models.User).filter(models.User.role == 'student').all()
 
+# largest page the user and student listings will return
+MAX_PAGE_SIZE = 1000
+
+# keyset page of users (only the UserResponse columns) ordered by user_id, optionally
+# filtered by role and full_name prefix
+def _users_page_select(role, name_prefix, after: int, limit: int):
+    stmt = select(
+        models.User.user_id, models.User.username, models.User.full_name,
+        models.User.email, models.User.role
+    ).where(models.User.user_id > after)
+    if role:
+        stmt = stmt.where(models.User.role == role)
+    if name_prefix:
+        escaped = name_prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        stmt = stmt.where(models.User.full_name.like(escaped + '%', escape='\\'))
+    return stmt.order_by(models.User.user_id).limit(limit)
+
+# cursor for the next page, None when this page was the last one
+def _next_cursor(rows: list, limit: int):
+    return rows[-1].user_id if len(rows) == limit else None
+
+# fetch one page of users, returns (rows, next_after)
+def list_users(db: Session, role=None, name_prefix=None, after: int = 0, limit: int = 100):
+    rows = db.execute(_users_page_select(role, name_prefix, after, limit)).all()
+    return rows, _next_cursor(rows, limit)
+
+# the UserResponse columns of a student
+def _student_select(user_id: int):
+    return select(
+        models.User.user_id, models.User.username, models.User.full_name,
+        models.User.email, models.User.role
+    ).where(and_(models.User.user_id == user_id, models.User.role == 'student'))
+
 #fetch student by id
 def get_student_by_id(db: Session, user_id: int):
-    return db.query(models.User).filter(
-        and_(models.User.user_id == user_id, models.User.role == 'student')
-    ).first()
+    return db.execute(_student_select(user_id)).first()
 
 # for grade management ##
 
 # fetch all grades for a student with subject details and handle missing grades
-def get_student_grades(db: Session, student_id: int):
-    subjects = db.query(models.Subject).all()
-    grades = db.query(models.Grade).filter(models.Grade.student_id == student_id).all()
-    
+def get_student_grades(db: Session, student_id: int, grades=None):
+    subjects = get_all_subjects(db)
+    if grades is None:
+        grades = get_student_grade_rows(db, student_id)
+    return _merge_student_grades(subjects, grades)
+
+# one entry per subject, with grade_id and grade_value None where the student has no grade
+def _merge_student_grades(subjects: list, grades: list):
     grade_dict = {g.subject_id: g.grade_value for g in grades}
     grade_id_dict = {g.subject_id: g.grade_id for g in grades}
     
@@ -65,51 +122,296 @@ def get_student_grades(db: Session, student_id: int):
     
     return result
 
-# delete user
-def delete_user(db: Session, user_id: int):
-    user = db.query(models.User).filter(models.User.user_id == user_id).first()
-    if user:
-        db.delete(user)
-        db.commit()
-        return True
-    return False
+# fetch (grade_id, subject_id, grade_value) rows of a student, ordered for stable ETags
+def _student_grade_rows_select(student_id: int):
+    return select(
+        models.Grade.grade_id, models.Grade.subject_id, models.Grade.grade_value
+    ).where(models.Grade.student_id == student_id).order_by(models.Grade.subject_id)
+
+def get_student_grade_rows(db: Session, student_id: int):
+    return db.execute(_student_grade_rows_select(student_id)).all()
+
+# stream one page of the class gradebook as (student_id, full_name, grades) with grades
+# ordered like subject_ids, using a single students LEFT JOIN grades query
+def iter_gradebook_rows(db: Session, subject_ids: list, after: int, limit: int):
+    page = (
+        select(models.User.user_id, models.User.full_name)
+        .where(models.User.role == 'student', models.User.user_id > after)
+        .order_by(models.User.user_id)
+        .limit(limit)
+        .subquery()
+    )
+    stmt = (
+        select(page.c.user_id, page.c.full_name, models.Grade.subject_id, models.Grade.grade_value)
+        .outerjoin(models.Grade, models.Grade.student_id == page.c.user_id)
+        .order_by(page.c.user_id)
+    )
+    column = {subject_id: i for i, subject_id in enumerate(subject_ids)}
+
+    current = None
+    for student_id, full_name, subject_id, grade_value in db.execute(stmt.execution_options(yield_per=1000)):
+        if current is None or current[0] != student_id:
+            if current is not None:
+                yield current
+            current = (student_id, full_name, [None] * len(subject_ids))
+        if subject_id in column:
+            current[2][column[subject_id]] = grade_value
+    if current is not None:
+        yield current
+
+# grades are deleted in batches, one transaction per batch, so no single statement
+# holds locks on every grade of a large subject or student
+DELETE_BATCH_SIZE = 1000
+
+# one batch of the grades of a student or subject, locked for deletion
+def _grades_batch_select(column, scope_id: int, limit: int):
+    return select(
+        models.Grade.grade_id, models.Grade.student_id, models.Grade.subject_id, models.Grade.grade_value
+    ).where(column == scope_id).order_by(models.Grade.grade_id).limit(limit).with_for_update()
+
+# delete the grades where column == scope_id batch by batch with set-based statements
+# (no ORM loading), then the parent row together with the last batch; progress(n) is
+# called with the number of grades deleted so far. Returns whether the parent existed.
+def _delete_with_grades(db: Session, parent_delete, column, scope_id: int, batch_size: int, progress=None):
+    deleted = 0
+    while True:
+        rows = db.execute(_grades_batch_select(column, scope_id, batch_size)).all()
+        if rows:
+            _record_grade_changes(db, [(r.student_id, r.subject_id, r.grade_value, None) for r in rows])
+            db.execute(delete(models.Grade).where(models.Grade.grade_id.in_([r.grade_id for r in rows])))
+        last = len(rows) < batch_size
+        if last:
+            # the parent's statistics row goes with it via ON DELETE CASCADE
+            found = db.execute(parent_delete).rowcount > 0
+        _commit_grade_changes(db)
+        deleted += len(rows)
+        if progress:
+            progress(deleted)
+        if last:
+            return found
+
+# delete a user and their grades
+def delete_user(db: Session, user_id: int, batch_size: int = DELETE_BATCH_SIZE, progress=None):
+    found = _delete_with_grades(
+        db, delete(models.User).where(models.User.user_id == user_id),
+        models.Grade.student_id, user_id, batch_size, progress
+    )
+    invalidate_principal(user_id)
+    return found
+
+# Change log ids must become visible in increasing order, or a client polling while a long
+# transaction (e.g. a bulk save) is open could move its cursor past that transaction's
+# entries before they commit. Entries are therefore queued on the session and written by
+# _commit_grade_changes right before the commit, with change_ids reserved from the locked
+# grade_change_sequence row: a later writer waits for the lock, so it gets higher ids and
+# commits later.
+
+# record (student_id, subject_id, old, new) changes inside the caller's transaction:
+# statistics deltas now, change log entries (cells whose value changed) at commit
+def _record_grade_changes(db: Session, changes: list):
+    for stmt in stats.stats_statements(db.get_bind().dialect.name, changes):
+        db.execute(stmt)
+    now = datetime.utcnow()
+    db.info.setdefault('grade_change_log', []).extend(
+        {'student_id': st, 'subject_id': su, 'grade_value': new, 'changed_at': now}
+        for st, su, old, new in changes if old != new
+    )
+
+# reserve count change_ids, returns the last one; the sequence row (inserted by schema.sql
+# or create_all) stays locked until commit
+def _reserve_change_ids(db: Session, count: int):
+    sequence = models.GradeChangeSequence
+    db.execute(update(sequence).where(sequence.id == 1).values(last_change_id=sequence.last_change_id + count))
+    return db.scalar(select(sequence.last_change_id).where(sequence.id == 1))
+
+# write the queued change log entries
+def _flush_grade_change_log(db: Session):
+    log = db.info.pop('grade_change_log', None)
+    if log:
+        last = _reserve_change_ids(db, len(log))
+        for change_id, entry in enumerate(log, last - len(log) + 1):
+            entry['change_id'] = change_id
+        db.execute(models.GradeChange.__table__.insert(), log)
+
+# commit a transaction that called _record_grade_changes
+def _commit_grade_changes(db: Session):
+    _flush_grade_change_log(db)
+    db.commit()
+
+# drop queued change log entries along with a rolled back transaction
+def _rollback_grade_changes(db: Session):
+    db.info.pop('grade_change_log', None)
+    db.rollback()
+
+# changes after cursor since, oldest first, optionally for one student
+def _grade_changes_select(since: int, limit: int, student_id=None):
+    stmt = select(
+        models.GradeChange.change_id, models.GradeChange.student_id, models.GradeChange.subject_id,
+        models.GradeChange.grade_value, models.GradeChange.changed_at
+    ).where(models.GradeChange.change_id > since)
+    if student_id is not None:
+        stmt = stmt.where(models.GradeChange.student_id == student_id)
+    return stmt.order_by(models.GradeChange.change_id).limit(limit)
+
+# fetch grade changes after cursor since
+def get_grade_changes(db: Session, since: int, limit: int = 500, student_id=None):
+    return db.execute(_grade_changes_select(since, limit, student_id)).all()
+
+# latest change cursor, 0 when nothing was logged yet
+def get_latest_change_id(db: Session):
+    return db.scalar(select(func.max(models.GradeChange.change_id))) or 0
 
 # update or create grade for a student in a subject if not exists
 def update_grade(db: Session, student_id: int, subject_id: int, grade_value: float):
     grade = db.query(models.Grade).filter(
         and_(models.Grade.student_id == student_id, models.Grade.subject_id == subject_id)
-    ).first()
+    ).with_for_update().first()
     
+    old_value = grade.grade_value if grade else None
     if grade:
         grade.grade_value = grade_value
     else:
         grade = models.Grade(student_id=student_id, subject_id=subject_id, grade_value=grade_value)
         db.add(grade)
     
-    db.commit()
+    _record_grade_changes(db, [(student_id, subject_id, old_value, grade_value)])
+    _commit_grade_changes(db)
     db.refresh(grade)
     return grade
 
+# max rows per multi-row INSERT statement, keeps packets well under max_allowed_packet
+BULK_GRADE_CHUNK_SIZE = 500
+
+# build a dialect specific upsert keyed on unique_student_subject
+def _grade_upsert_statement(dialect: str, rows: list):
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(models.Grade).values(rows)
+        return stmt.on_duplicate_key_update(
+            grade_value=stmt.inserted.grade_value,
+            updated_at=stmt.inserted.updated_at
+        )
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    stmt = insert(models.Grade).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=['student_id', 'subject_id'],
+        set_={'grade_value': stmt.excluded.grade_value, 'updated_at': stmt.excluded.updated_at}
+    )
+
+# lookups validating the students and subjects of a bulk update, one query each instead of one per row
+def _valid_student_ids_select(student_ids: set):
+    return select(models.User.user_id).where(models.User.user_id.in_(student_ids), models.User.role == 'student')
+
+def _valid_subject_ids_select(subject_ids: set):
+    return select(models.Subject.subject_id).where(models.Subject.subject_id.in_(subject_ids))
+
+# current values of the cells about to be upserted, locked until commit
+def _existing_grades_select(rows: list):
+    return select(
+        models.Grade.student_id, models.Grade.subject_id, models.Grade.grade_value
+    ).where(
+        models.Grade.student_id.in_({r['student_id'] for r in rows}),
+        models.Grade.subject_id.in_({r['subject_id'] for r in rows})
+    ).with_for_update()
+
+# (student_id, subject_id, old, new) changes of an upsert chunk for the statistics
+def _grade_changes(rows: list, existing):
+    old = {(e.student_id, e.subject_id): e.grade_value for e in existing}
+    return [
+        (r['student_id'], r['subject_id'], old.get((r['student_id'], r['subject_id'])), r['grade_value'])
+        for r in rows
+    ]
+
+# split bulk items into per-row results and the deduplicated rows to upsert
+def _bulk_grade_rows(items: list, valid_students: set, valid_subjects: set):
+    now = datetime.utcnow()
+    results = []
+    rows = {}
+    for item in items:
+        result = {'student_id': item.student_id, 'subject_id': item.subject_id, 'status': 'ok', 'detail': None}
+        if item.student_id not in valid_students:
+            result.update(status='error', detail='Student not found')
+        elif item.subject_id not in valid_subjects:
+            result.update(status='error', detail='Subject not found')
+        else:
+            # last value wins when the same cell is sent twice
+            rows[(item.student_id, item.subject_id)] = {
+                'student_id': item.student_id,
+                'subject_id': item.subject_id,
+                'grade_value': item.grade_value,
+                'updated_at': now
+            }
+        results.append(result)
+    return results, list(rows.values())
+
+# update or create many grades in one transaction, returns one result per input row
+def bulk_upsert_grades(db: Session, items: list):
+    student_ids = {item.student_id for item in items}
+    subject_ids = {item.subject_id for item in items}
+    valid_students = set(db.scalars(_valid_student_ids_select(student_ids))) if student_ids else set()
+    valid_subjects = set(db.scalars(_valid_subject_ids_select(subject_ids))) if subject_ids else set()
+    results, rows = _bulk_grade_rows(items, valid_students, valid_subjects)
+
+    dialect = db.get_bind().dialect.name
+    try:
+        for start in range(0, len(rows), BULK_GRADE_CHUNK_SIZE):
+            chunk = rows[start:start + BULK_GRADE_CHUNK_SIZE]
+            existing = db.execute(_existing_grades_select(chunk)).all()
+            db.execute(_grade_upsert_statement(dialect, chunk))
+            _record_grade_changes(db, _grade_changes(chunk, existing))
+        _commit_grade_changes(db)
+    except Exception:
+        _rollback_grade_changes(db)
+        raise
+    return results
+
 
 # Subject mananagement##
 
+# subject as held in the catalog cache, detached from any session
+class SubjectEntry(NamedTuple):
+    subject_id: int
+    subject_name: str
+
+# subject catalog cached in each process, reloaded after create_subject or delete_subject bump
+# its version (shared between workers with CACHE_BACKEND=redis)
+subject_catalog = VersionedValue(make_counter("subject_catalog"))
+
+_subject_catalog_select = select(models.Subject.subject_id, models.Subject.subject_name).order_by(models.Subject.subject_id)
+
+# (subjects, etag) catalog value built from _subject_catalog_select rows
+def _build_subject_catalog(rows):
+    subjects = [SubjectEntry(*row) for row in rows]
+    return subjects, compute_etag(subjects)
+
+def _load_subject_catalog(db: Session):
+    return _build_subject_catalog(db.execute(_subject_catalog_select))
+
+# fetch (subjects, etag) from the catalog cache
+def get_subject_catalog(db: Session):
+    return subject_catalog.get(lambda: _load_subject_catalog(db))
+
 # fetch all subjects
 def get_all_subjects(db: Session):
-    return db.query(models.Subject).all()
+    return get_subject_catalog(db)[0]
 
 # create new subject
 def create_subject(db: Session, subject_name: str):
     subject = models.Subject(subject_name=subject_name)
     db.add(subject)
     db.commit()
+    subject_catalog.bump()
     db.refresh(subject)
     return subject
 
 # delete subject
-def delete_subject(db: Session, subject_id: int):
-    subject = db.query(models.Subject).filter(models.Subject.subject_id == subject_id).first()
-    if subject:
-        db.delete(subject)
-        db.commit()
-        return True
-    return False
\ No newline at end of file
+def delete_subject(db: Session, subject_id: int, batch_size: int = DELETE_BATCH_SIZE, progress=None):
+    found = _delete_with_grades(
+        db, delete(models.Subject).where(models.Subject.subject_id == subject_id),
+        models.Grade.subject_id, subject_id, batch_size, progress
+    )
+    subject_catalog.bump()
+    return found
\ No newline at end of file
@@ -0,0 +1,123 @@
+# Async versions of the crud functions used by the async routes (DB_ASYNC=true).
+# Names and signatures match crud.py; statements and caches are shared with it.
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+from .crud import (
+    BULK_GRADE_CHUNK_SIZE, subject_catalog,
+    _build_subject_catalog, _bulk_grade_rows, _existing_grades_select, _flush_grade_change_log,
+    _grade_changes, _grade_changes_select, _grade_upsert_statement, _login_select,
+    _merge_student_grades, _next_cursor, _student_grade_rows_select, _student_select, _subject_catalog_select,
+    _record_grade_changes as _record_grade_changes_sync, _users_page_select,
+    _valid_student_ids_select, _valid_subject_ids_select,
+)
+from .cache import MISSING
+
+# User operations #
+
+# fetch login columns by username, then by email
+async def get_user_by_login(db: AsyncSession, login: str):
+    user = (await db.execute(_login_select(models.User.username, login))).first()
+    if user is None and '@' in login:
+        user = (await db.execute(_login_select(models.User.email, login))).first()
+    return user
+
+# replace a user's stored password hash
+async def set_user_password(db: AsyncSession, user_id: int, password_hash: str):
+    await db.execute(
+        models.User.__table__.update()
+        .where(models.User.user_id == user_id)
+        .values(password=password_hash)
+    )
+    await db.commit()
+
+# fetch one page of users, returns (rows, next_after)
+async def list_users(db: AsyncSession, role=None, name_prefix=None, after: int = 0, limit: int = 100):
+    rows = (await db.execute(_users_page_select(role, name_prefix, after, limit))).all()
+    return rows, _next_cursor(rows, limit)
+
+#fetch student by id
+async def get_student_by_id(db: AsyncSession, user_id: int):
+    return (await db.execute(_student_select(user_id))).first()
+
+# grade operations #
+
+# fetch all grades for a student with subject details and handle missing grades
+async def get_student_grades(db: AsyncSession, student_id: int, grades=None):
+    subjects = await get_all_subjects(db)
+    if grades is None:
+        grades = await get_student_grade_rows(db, student_id)
+    return _merge_student_grades(subjects, grades)
+
+async def get_student_grade_rows(db: AsyncSession, student_id: int):
+    return (await db.execute(_student_grade_rows_select(student_id))).all()
+
+# fetch grade changes after cursor since
+async def get_grade_changes(db: AsyncSession, since: int, limit: int = 500, student_id=None):
+    return (await db.execute(_grade_changes_select(since, limit, student_id))).all()
+
+# async versions of crud._record_grade_changes, _commit_grade_changes and
+# _rollback_grade_changes, running the sync code on the session's greenlet
+async def _record_grade_changes(db: AsyncSession, changes):
+    await db.run_sync(_record_grade_changes_sync, changes)
+
+async def _commit_grade_changes(db: AsyncSession):
+    await db.run_sync(_flush_grade_change_log)
+    await db.commit()
+
+async def _rollback_grade_changes(db: AsyncSession):
+    db.info.pop('grade_change_log', None)
+    await db.rollback()
+
+# update or create grade for a student in a subject if not exists
+async def update_grade(db: AsyncSession, student_id: int, subject_id: int, grade_value):
+    grade = (await db.scalars(select(models.Grade).where(
+        and_(models.Grade.student_id == student_id, models.Grade.subject_id == subject_id)
+    ).with_for_update())).first()
+
+    old_value = grade.grade_value if grade else None
+    if grade:
+        grade.grade_value = grade_value
+    else:
+        grade = models.Grade(student_id=student_id, subject_id=subject_id, grade_value=grade_value)
+        db.add(grade)
+
+    await _record_grade_changes(db, [(student_id, subject_id, old_value, grade_value)])
+    await _commit_grade_changes(db)
+    await db.refresh(grade)
+    return grade
+
+# update or create many grades in one transaction, returns one result per input row
+async def bulk_upsert_grades(db: AsyncSession, items: list):
+    student_ids = {item.student_id for item in items}
+    subject_ids = {item.subject_id for item in items}
+    valid_students = set(await db.scalars(_valid_student_ids_select(student_ids))) if student_ids else set()
+    valid_subjects = set(await db.scalars(_valid_subject_ids_select(subject_ids))) if subject_ids else set()
+    results, rows = _bulk_grade_rows(items, valid_students, valid_subjects)
+
+    dialect = db.get_bind().dialect.name
+    try:
+        for start in range(0, len(rows), BULK_GRADE_CHUNK_SIZE):
+            chunk = rows[start:start + BULK_GRADE_CHUNK_SIZE]
+            existing = (await db.execute(_existing_grades_select(chunk))).all()
+            await db.execute(_grade_upsert_statement(dialect, chunk))
+            await _record_grade_changes(db, _grade_changes(chunk, existing))
+        await _commit_grade_changes(db)
+    except Exception:
+        await _rollback_grade_changes(db)
+        raise
+    return results
+
+# subject operations #
+
+# fetch (subjects, etag) from the catalog cache shared with crud
+async def get_subject_catalog(db: AsyncSession):
+    version, catalog = await subject_catalog.peek_async()
+    if catalog is MISSING:
+        catalog = _build_subject_catalog(await db.execute(_subject_catalog_select))
+        subject_catalog.store(version, catalog)
+    return catalog
+
+# fetch all subjects
+async def get_all_subjects(db: AsyncSession):
+    return (await get_subject_catalog(db))[0]
@@ -1,30 +1,120 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
+import threading
 from dotenv import load_dotenv
 from urllib.parse import quote_plus
+from .metrics import TimedAsyncAdaptedQueuePool, TimedQueuePool, instrument_engine
 
 
 load_dotenv()
 
 DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = quote_plus(os.getenv("DB_PASSWORD"))
+DB_PASSWORD = quote_plus(os.getenv("DB_PASSWORD", ""))
 DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")
 DB_NAME = os.getenv("DB_NAME")
 
-DATABASE_URL = (
+# a full DATABASE_URL (e.g. sqlite:///grades.db) overrides the DB_* settings
+DATABASE_URL = os.getenv("DATABASE_URL") or (
     f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 )
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# DB_ASYNC=true serves the dashboard and grade endpoints through an async engine
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() in ("1", "true", "yes")
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or (
+    f"mysql+aiomysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+)
+
+# connection pool tuning, see .env.example
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# recycle connections before MySQL's wait_timeout (default 8h) closes them
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+def _engine_options(url: str, poolclass):
+    options = {"pool_pre_ping": DB_POOL_PRE_PING}
+    # SQLite keeps its own pool classes, sizing options only apply to server databases
+    if not url.startswith("sqlite"):
+        options.update(
+            poolclass=poolclass,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+    return options
+
+# SQLite only enforces the ON DELETE CASCADE foreign keys when asked to, per connection
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
 Base = declarative_base()
 
+# Engines are created on first use (normally by the app's lifespan hook), not at import, and
+# the session factories are bound to them then. Creating an engine does not connect; the
+# first connection is opened by a session or by the startup warm-up in app/health.py.
+engine = None
+async_engine = None
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+AsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False)
+_engine_lock = threading.Lock()
+
+def get_engine():
+    global engine
+    if engine is None:
+        with _engine_lock:
+            if engine is None:
+                created = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL, TimedQueuePool))
+                instrument_engine(created, "sync")
+                if DATABASE_URL.startswith("sqlite"):
+                    event.listen(created, "connect", _enable_sqlite_foreign_keys)
+                SessionLocal.configure(bind=created)
+                engine = created
+    return engine
+
+# async engine, only used when DB_ASYNC is enabled
+def get_async_engine():
+    global async_engine
+    if async_engine is None:
+        with _engine_lock:
+            if async_engine is None:
+                created = create_async_engine(
+                    ASYNC_DATABASE_URL, **_engine_options(ASYNC_DATABASE_URL, TimedAsyncAdaptedQueuePool)
+                )
+                instrument_engine(created.sync_engine, "async")
+                if ASYNC_DATABASE_URL.startswith("sqlite"):
+                    event.listen(created.sync_engine, "connect", _enable_sqlite_foreign_keys)
+                AsyncSessionLocal.configure(bind=created)
+                async_engine = created
+    return async_engine
+
+# new session on the (lazily created) engine, for scripts and background work
+def new_session():
+    get_engine()
+    return SessionLocal()
+
 def get_db():
-    db = SessionLocal()
+    db = new_session()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    get_async_engine()
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# close the pooled connections of the engines created so far, on shutdown
+async def dispose_engines():
+    if async_engine is not None:
+        await async_engine.dispose()
+    if engine is not None:
+        engine.dispose()
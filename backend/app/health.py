@@ -0,0 +1,62 @@
+# Liveness/readiness checks and the startup warm-up.
+# Startup does not wait for the database: warm_up() keeps trying to open a first connection
+# in the background (backing off up to DB_CONNECT_RETRY_MAX seconds) and resumes queued jobs
+# once it succeeds. Until then /health/ready reports 503 so no traffic is routed to the worker.
+import asyncio
+import logging
+import os
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+
+from . import cache, database, jobs
+
+logger = logging.getLogger("grade_api.health")
+
+DB_CONNECT_RETRY_MAX = float(os.getenv("DB_CONNECT_RETRY_MAX", "30"))
+
+
+# run SELECT 1 on the sync engine, raises when the database is unreachable
+def check_database():
+    with database.get_engine().connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+
+# run SELECT 1 on the async engine (DB_ASYNC), on the event loop its connections belong to
+async def check_async_database():
+    async with database.get_async_engine().connect() as connection:
+        await connection.execute(text("SELECT 1"))
+
+
+# name -> error message (None when healthy) for every dependency the API needs to serve requests;
+# the sync checks run in the threadpool, the async engine is checked on the loop
+async def readiness_checks() -> dict:
+    checks = {}
+    probes = [("database", check_database), ("cache", cache.ping)]
+    if database.DB_ASYNC:
+        probes.insert(1, ("async_database", check_async_database))
+    for name, check in probes:
+        try:
+            if asyncio.iscoroutinefunction(check):
+                await check()
+            else:
+                await run_in_threadpool(check)
+            checks[name] = None
+        except Exception as exc:
+            checks[name] = f"{type(exc).__name__}: {exc}"[:200]
+    return checks
+
+
+# open the first database connection in the background, then resume queued jobs
+async def warm_up():
+    delay = 0.5
+    while True:
+        try:
+            await run_in_threadpool(check_database)
+            break
+        except Exception as exc:
+            logger.warning("database not reachable yet, retrying in %.1fs: %s", delay, exc)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, DB_CONNECT_RETRY_MAX)
+    logger.info("database connection established")
+    await run_in_threadpool(jobs.resume_queued, database.get_engine())
@@ -0,0 +1,242 @@
+# Streaming CSV import of users and grades, used by POST /api/import/{kind} and the CLI:
+#   python -m app.importer users users.csv
+#   python -m app.importer grades grades.csv
+# Users CSV columns: full_name,email,role,username,password
+# Grades CSV columns: student_id,subject_id,grade_value
+import argparse
+import csv
+import io
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from pydantic import ValidationError
+from sqlalchemy import or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import crud, models, schemas, security
+from .constants import ALL_ROLES
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+# imported passwords get the same PBKDF2 strength as every other password by default. Lowering
+# this is an explicit opt-in for throwaway data: login upgrades a weaker hash, but only for
+# users who log in.
+IMPORT_HASH_ITERATIONS = int(os.getenv("IMPORT_HASH_ITERATIONS", str(security.HASH_ITERATIONS)))
+# processes hashing the passwords of a chunk, 0 hashes in the importing thread
+IMPORT_HASH_WORKERS = int(os.getenv("IMPORT_HASH_WORKERS", str(os.cpu_count() or 1)))
+# at most this many row errors are kept in the report
+MAX_REPORTED_ERRORS = 1000
+
+IMPORT_KINDS = ("users", "grades")
+
+
+class ImportReport:
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.rows = 0
+        self.imported = 0
+        self.errors = []
+        self.failed = 0
+        self._start = time.perf_counter()
+
+    def error(self, line: int, detail: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": detail})
+
+    def as_dict(self):
+        elapsed = time.perf_counter() - self._start
+        return {
+            "kind": self.kind,
+            "rows": self.rows,
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": sorted(self.errors, key=lambda e: e["line"]),
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(self.rows / elapsed, 1) if elapsed else 0.0,
+        }
+
+
+def _validation_message(exc: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in exc.errors())
+
+
+# validate a chunk of (line, row) pairs against schema, recording failures in report
+def _validate(chunk, schema, report: ImportReport):
+    valid = []
+    for line, row in chunk:
+        try:
+            valid.append((line, schema(**row)))
+        except ValidationError as exc:
+            report.error(line, _validation_message(exc))
+        except TypeError:
+            report.error(line, "Malformed row")
+    return valid
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# hashing pool, started on first use; spawned like the report render pool so the workers
+# do not inherit the parent's pooled database connections
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(IMPORT_HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+# stop the hashing pool, on shutdown
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+# PBKDF2 hashes of passwords, in order, split evenly over the hashing processes
+def _hash_passwords(passwords: list) -> list:
+    if IMPORT_HASH_WORKERS <= 0 or len(passwords) < 2:
+        return [security.hash_password(p, IMPORT_HASH_ITERATIONS) for p in passwords]
+    chunksize = math.ceil(len(passwords) / IMPORT_HASH_WORKERS)
+    return list(_get_pool().map(security.hash_password, passwords, repeat(IMPORT_HASH_ITERATIONS), chunksize=chunksize))
+
+
+# ("email", email) and ("username", username) pairs of users already stored
+def _taken(db: Session, users: list) -> set:
+    emails = {u.email for _, u in users}
+    usernames = {u.username for _, u in users}
+    existing = db.execute(
+        select(models.User.email, models.User.username)
+        .where(or_(models.User.email.in_(emails), models.User.username.in_(usernames)))
+    ).all()
+    return {("email", r.email) for r in existing} | {("username", r.username) for r in existing}
+
+
+# insert (line, row) pairs one at a time, reporting the ones that clash with stored users
+def _insert_users_one_by_one(db: Session, rows: list, report: ImportReport):
+    for line, row in rows:
+        try:
+            db.execute(models.User.__table__.insert(), row)
+            db.commit()
+            report.imported += 1
+        except IntegrityError:
+            db.rollback()
+            email_taken = db.scalar(select(models.User.user_id).where(models.User.email == row["email"]))
+            report.error(line, "User already exists" if email_taken else "Username already taken")
+
+
+def _import_users_chunk(db: Session, chunk, report: ImportReport, seen: set):
+    users = []
+    for line, user in _validate(chunk, schemas.UserCreate, report):
+        if user.role not in ALL_ROLES:
+            report.error(line, f"Invalid role '{user.role}'")
+        else:
+            users.append((line, user))
+    if not users:
+        return
+
+    # one set-based lookup per chunk for users that already exist
+    taken = _taken(db, users)
+
+    accepted = []
+    for line, user in users:
+        if ("email", user.email) in taken or ("email", user.email) in seen:
+            report.error(line, "User already exists")
+            continue
+        if ("username", user.username) in taken or ("username", user.username) in seen:
+            report.error(line, "Username already taken")
+            continue
+        seen.add(("email", user.email))
+        seen.add(("username", user.username))
+        accepted.append((line, user))
+
+    plain = [user.password for _, user in accepted if not security.is_hashed(user.password)]
+    hashes = iter(_hash_passwords(plain))
+    rows = [(line, {
+        "full_name": user.full_name,
+        "email": user.email,
+        "role": user.role,
+        "username": user.username,
+        "password": user.password if security.is_hashed(user.password) else next(hashes),
+    }) for line, user in accepted]
+    if not rows:
+        return
+    try:
+        # executemany of one INSERT per chunk
+        db.execute(models.User.__table__.insert(), [row for _, row in rows])
+        db.commit()
+        report.imported += len(rows)
+    except IntegrityError:
+        # a concurrent import or signup took an email or username after the lookup
+        db.rollback()
+        _insert_users_one_by_one(db, rows, report)
+
+
+def _import_grades_chunk(db: Session, chunk, report: ImportReport, seen: set):
+    valid = _validate(chunk, schemas.GradeBulkItem, report)
+    if not valid:
+        return
+    results = crud.bulk_upsert_grades(db, [item for _, item in valid])
+    for (line, _), result in zip(valid, results):
+        if result["status"] == "ok":
+            report.imported += 1
+        else:
+            report.error(line, result["detail"])
+
+
+# import a CSV read from text stream in chunks, returns the report as a dict
+def import_csv(db: Session, kind: str, stream, chunk_size: int = IMPORT_CHUNK_SIZE):
+    if kind not in IMPORT_KINDS:
+        raise ValueError(f"Unknown import kind '{kind}'")
+    import_chunk = _import_users_chunk if kind == "users" else _import_grades_chunk
+    report = ImportReport(kind)
+    seen = set()
+
+    reader = csv.DictReader(stream)
+    # line 1 is the header
+    rows = ((index + 2, row) for index, row in enumerate(reader))
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            break
+        report.rows += len(chunk)
+        import_chunk(db, chunk, report, seen)
+    return report.as_dict()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import users or grades from a CSV file")
+    parser.add_argument("kind", choices=IMPORT_KINDS)
+    parser.add_argument("path", help="CSV file, - for stdin")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    from .database import new_session
+
+    stream = sys.stdin if args.path == "-" else io.open(args.path, newline="", encoding="utf-8")
+    db = new_session()
+    try:
+        report = import_csv(db, args.kind, stream, args.chunk_size)
+    finally:
+        db.close()
+        stream.close()
+        shutdown()
+    print(json.dumps(report, indent=2))
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
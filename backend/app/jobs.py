@@ -0,0 +1,137 @@
+# Background jobs for heavy admin operations (subject and user deletion).
+# Jobs are rows in the jobs table, so their status can be polled from any API worker;
+# they run on a small in-process thread pool, each in its own session, and delete in
+# bounded batches (crud.DELETE_BATCH_SIZE grades per transaction).
+#
+# Jobs left queued by a stopped process are picked up again on startup, see resume_queued().
+# A running job refreshes heartbeat_at after every batch; one whose heartbeat is older than
+# JOB_LEASE_SECONDS lost its worker and goes back to queued (see reclaim_stale()). Re-running
+# it is safe, the batched deletes only touch what is still there.
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import and_, func, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from . import crud, models
+
+logger = logging.getLogger("grade_api.jobs")
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", str(crud.DELETE_BATCH_SIZE)))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+
+_job_pool = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="jobs")
+
+# job kinds and the crud operation each one runs as operation(db, target_id, batch_size, progress)
+DELETE_SUBJECT = "delete_subject"
+DELETE_USER = "delete_user"
+OPERATIONS = {
+    DELETE_SUBJECT: crud.delete_subject,
+    DELETE_USER: crud.delete_user,
+}
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+# fetch job by id
+def get_job(db: Session, job_id: int):
+    return db.get(models.Job, job_id)
+
+
+# condition matching running jobs whose worker stopped refreshing heartbeat_at
+def _stale():
+    cutoff = datetime.utcnow() - timedelta(seconds=JOB_LEASE_SECONDS)
+    return and_(models.Job.status == "running",
+                func.coalesce(models.Job.heartbeat_at, models.Job.started_at) < cutoff)
+
+
+# put running jobs with an expired lease (or just job_id) back in queued, returning how many
+def reclaim_stale(db: Session, job_id: int = None):
+    condition = _stale()
+    if job_id is not None:
+        condition = and_(condition, models.Job.job_id == job_id)
+    reclaimed = db.execute(
+        update(models.Job).where(condition).values(status="queued"),
+        execution_options={"synchronize_session": False}
+    ).rowcount
+    db.commit()
+    if reclaimed:
+        logger.warning("reclaimed %d job(s) from stopped workers", reclaimed)
+    return reclaimed
+
+
+# queue kind for target_id, returning the already queued or running job for it if any;
+# a running job whose worker is gone is queued again and resubmitted
+def enqueue(db: Session, kind: str, target_id: int):
+    job = db.execute(select(models.Job).where(
+        models.Job.kind == kind,
+        models.Job.target_id == target_id,
+        models.Job.status.in_(ACTIVE_STATUSES)
+    )).scalars().first()
+    if job is not None:
+        if job.status == "running" and reclaim_stale(db, job.job_id):
+            db.refresh(job)
+            submit(db.get_bind(), job.job_id)
+        return job
+    job = models.Job(kind=kind, target_id=target_id, status="queued")
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    submit(db.get_bind(), job.job_id)
+    return job
+
+
+# run job_id on the job pool against engine
+def submit(engine: Engine, job_id: int):
+    _job_pool.submit(run_job, engine, job_id)
+
+
+# claim and run one job, recording progress and the outcome on its row
+def run_job(engine: Engine, job_id: int):
+    with Session(bind=engine, autoflush=False) as db:
+        # only one worker (or process) moves a job out of queued
+        claimed = db.execute(
+            update(models.Job)
+            .where(models.Job.job_id == job_id, models.Job.status == "queued")
+            .values(status="running", started_at=datetime.utcnow(), heartbeat_at=datetime.utcnow())
+        ).rowcount
+        db.commit()
+        if not claimed:
+            return
+        job = db.get(models.Job, job_id)
+        kind, target_id = job.kind, job.target_id
+
+        def progress(processed: int):
+            _set(db, job_id, processed=processed, heartbeat_at=datetime.utcnow())
+
+        try:
+            OPERATIONS[kind](db, target_id, JOB_BATCH_SIZE, progress)
+        except Exception as exc:
+            db.rollback()
+            logger.exception("job %s (%s %s) failed", job_id, kind, target_id)
+            _set(db, job_id, status="failed", error=str(exc)[:255], finished_at=datetime.utcnow())
+            return
+        _set(db, job_id, status="done", finished_at=datetime.utcnow())
+
+
+def _set(db: Session, job_id: int, **values):
+    db.execute(update(models.Job).where(models.Job.job_id == job_id).values(**values))
+    db.commit()
+
+
+# reclaim running jobs of stopped workers and submit every queued job, called on startup
+def resume_queued(engine: Engine):
+    try:
+        with Session(bind=engine) as db:
+            reclaim_stale(db)
+            job_ids = db.scalars(
+                select(models.Job.job_id).where(models.Job.status == "queued").order_by(models.Job.job_id)
+            ).all()
+    except SQLAlchemyError:
+        logger.warning("could not resume queued jobs", exc_info=True)
+        return
+    for job_id in job_ids:
+        submit(engine, job_id)
@@ -1,12 +1,47 @@
-from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-from . import models, schemas, crud
-from .database import get_db
-from .constants import UserRole, ADMIN_ONLY, TEACHER_AND_ADMIN, STUDENT_ONLY
+from typing import List, Optional
+import asyncio
+import io
+import json
+import os
+import tempfile
+from contextlib import asynccontextmanager
+from . import models, schemas, crud, database, health, security, importer, jobs, ratelimit, reports, stats, profiling
+from .cache import compute_etag, etag_matches, not_modified
+from .serialization import CompressionMiddleware, FastJSONResponse, row_dict, row_dicts
+from .auth import Principal, check_permission, get_principal, lookup_principal, principal_cache_stats
+from .database import DB_ASYNC, get_db
+from .metrics import render_metrics
+from .constants import UserRole, ADMIN_ONLY, TEACHER_AND_ADMIN, STUDENT_ONLY, ALL_ROLES
 
-app = FastAPI(title="Grade Entry System API")
+# create the engines when the worker starts and connect in the background, so a slow
+# database delays readiness instead of failing startup; the warm-up also resumes queued jobs
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    database.get_engine()
+    if DB_ASYNC:
+        database.get_async_engine()
+    warm_up = asyncio.create_task(health.warm_up())
+    yield
+    warm_up.cancel()
+    reports.shutdown()
+    importer.shutdown()
+    await database.dispose_engines()
+
+app = FastAPI(title="Grade Entry System API", lifespan=lifespan, default_response_class=FastJSONResponse)
+
+# seconds between polls of the grade change log by the live update stream
+CHANGE_STREAM_POLL_SECONDS = float(os.getenv("CHANGE_STREAM_POLL_SECONDS", "2"))
+CHANGE_STREAM_BATCH_SIZE = 500
+
+# shed bursts on the login and write paths with 429 before they reach the database pool;
+# added before CORS so rejections still carry the CORS headers
+if ratelimit.RATE_LIMIT_ENABLED:
+    app.add_middleware(ratelimit.RateLimitMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -14,12 +49,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # let the frontend read the pagination cursor and cache validators
+    expose_headers=["X-Next-Cursor", "ETag", "Retry-After"],
 )
 
-# function to check user permissions based on role
-def check_permission(current_user: models.User, allowed_roles: List[str]):
-    if current_user.role not in allowed_roles:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
+# gzip large responses (student lists, grade sheets, gradebook pages)
+app.add_middleware(CompressionMiddleware)
+
+# opt-in per-request query counting, Server-Timing headers and slow request profiles
+if profiling.PROFILING_ENABLED:
+    profiling.install()
+    app.add_middleware(profiling.ProfilingMiddleware)
+
+# async mode: register the async handlers first so they win over the sync ones below
+if DB_ASYNC:
+    from .routes_async import router as async_router
+    app.include_router(async_router)
 
 # function to create user if not exists
 def create_user_if_not_exists(db: Session, full_name: str, email: str, role: str, username: str, password: str):
@@ -35,56 +80,116 @@ def create_user_if_not_exists(db: Session, full_name: str, email: str, role: str
 
 # Authentication endpoint validating user credentials and returning user info
 @app.post("/api/auth/login", response_model=schemas.UserResponse)
-def login(user_login: schemas.UserLogin, db: Session = Depends(get_db)):
-    print("LOGIN INPUT:", user_login.username, user_login.password)
-    user = crud.get_user_by_credentials(
-        db, user_login.username, user_login.password)
-    if not user:
+async def login(user_login: schemas.UserLogin, db: Session = Depends(get_db)):
+    # database work runs in the threadpool, hashing in the bounded hash pool
+    user = await run_in_threadpool(crud.get_user_by_login, db, user_login.username)
+    stored = user.password if user else await security.dummy_hash_async()
+    valid = await security.verify_password_async(user_login.password, stored)
+    if not user or not valid:
         raise HTTPException(status_code=401, detail="Invalid username or password")
+
+    # upgrade legacy plaintext or weaker hashes now that we know the password
+    if security.needs_rehash(user.password):
+        password_hash = await security.hash_password_async(user_login.password)
+        await run_in_threadpool(crud.set_user_password, db, user.user_id, password_hash)
     return user
 
 # teacher and admin endpoints returning list of students
 @app.get("/api/students", response_model=List[schemas.UserResponse])
-def list_students(user_id: int, db: Session = Depends(get_db)):
+def list_students(
+    after: int = Query(0, ge=0, description="Return students with user_id greater than this"),
+    limit: int = Query(100, ge=1, le=crud.MAX_PAGE_SIZE),
+    name: Optional[str] = Query(None, description="Full name prefix"),
+    user: Principal = Depends(get_principal),
+    db: Session = Depends(get_db)
+):
     # Verify user has permission (teacher or admin)
-    user = db.query(models.User).filter(models.User.user_id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
     check_permission(user, TEACHER_AND_ADMIN)
     
-    return crud.get_all_students(db)
+    students, next_after = crud.list_users(db, UserRole.STUDENT, name, after, limit)
+    headers = {"X-Next-Cursor": str(next_after)} if next_after is not None else None
+    return FastJSONResponse(row_dicts(students), headers=headers)
 
 # Grades endpoints for students and teachers/admins to view and update grades
 @app.get("/api/grades/my-grades", response_model=schemas.StudentGradesResponse)
-def get_my_grades(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.user_id == user_id).first()
+def get_my_grades(user_id: int, request: Request, db: Session = Depends(get_db)):
+    user = lookup_principal(db, user_id, "GET /api/grades/my-grades")
     if not user or user.role != UserRole.STUDENT:
         raise HTTPException(status_code=403, detail="Only students can view their own grades")
     
-    grades = crud.get_student_grades(db, user_id)
-    return {
-        "student": user,
+    # ETag covers the subject catalog, the student and their grade rows
+    grade_rows = crud.get_student_grade_rows(db, user_id)
+    etag = compute_etag(crud.get_subject_catalog(db)[1], tuple(user), [tuple(g) for g in grade_rows])
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    grades = crud.get_student_grades(db, user_id, grade_rows)
+    return FastJSONResponse({
+        "student": row_dict(user),
         "grades": grades
-    }
+    }, headers={"ETag": etag})
 
 # Teacher/Admin endpoint to get grades of a specific student
 @app.get("/api/grades/student/{student_id}", response_model=schemas.StudentGradesResponse)
-def get_student_grades(student_id: int, user_id: int, db: Session = Depends(get_db)):
+def get_student_grades(
+    student_id: int,
+    request: Request,
+    user: Principal = Depends(get_principal),
+    db: Session = Depends(get_db)
+):
     # Verify user has permission (teacher or admin)
-    user = db.query(models.User).filter(models.User.user_id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
     check_permission(user, TEACHER_AND_ADMIN)
     
     student = crud.get_student_by_id(db, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
-    grades = crud.get_student_grades(db, student_id)
-    return {
-        "student": student,
+    grade_rows = crud.get_student_grade_rows(db, student_id)
+    etag = compute_etag(
+        crud.get_subject_catalog(db)[1],
+        (student.user_id, student.username, student.full_name, student.email, student.role),
+        [tuple(g) for g in grade_rows]
+    )
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    grades = crud.get_student_grades(db, student_id, grade_rows)
+    return FastJSONResponse({
+        "student": row_dict(student),
         "grades": grades
-    }
+    }, headers={"ETag": etag})
+
+# Teacher/Admin endpoint returning the class gradebook as a student x subject matrix,
+# one page of students at a time, streamed row by row
+@app.get("/api/gradebook")
+def get_gradebook(
+    after: int = Query(0, ge=0, description="Return students with user_id greater than this"),
+    limit: int = Query(500, ge=1, le=5000, description="Maximum students in this page"),
+    user: Principal = Depends(get_principal),
+    db: Session = Depends(get_db)
+):
+    check_permission(user, TEACHER_AND_ADMIN)
+
+    subjects = crud.get_all_subjects(db)
+    subject_ids = [s.subject_id for s in subjects]
+    header = json.dumps({
+        "subject_ids": subject_ids,
+        "subject_names": [s.subject_name for s in subjects],
+    })
+
+    # rows are [student_id, full_name, grade for subject_ids[0], grade for subject_ids[1], ...]
+    def stream():
+        yield header[:-1] + ', "rows": ['
+        count = 0
+        last_id = None
+        for student_id, full_name, grades in crud.iter_gradebook_rows(db, subject_ids, after, limit):
+            yield ("," if count else "") + json.dumps([student_id, full_name, *grades])
+            count += 1
+            last_id = student_id
+        next_after = last_id if count == limit else None
+        yield '], "next_after": ' + json.dumps(next_after) + '}'
+
+    return StreamingResponse(stream(), media_type="application/json")
 
 # Endpoint for teachers/admins to update a student's exisitng grade for a subject
 @app.put("/api/grades/student/{student_id}/subject/{subject_id}")
@@ -92,54 +197,179 @@ def update_student_grade(
     student_id: int,
     subject_id: int,
     grade_update: schemas.GradeUpdate,
-    user_id: int,
+    user: Principal = Depends(get_principal),
     db: Session = Depends(get_db)
 ):
     # Verify user has permission (teacher or admin)
-    user = db.query(models.User).filter(models.User.user_id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
     check_permission(user, TEACHER_AND_ADMIN)
     
     grade = crud.update_grade(db, student_id, subject_id, grade_update.grade_value)
     return {"message": "Grade updated successfully"}
 
+# Endpoint for teachers/admins to update many grades (a student sheet or a class roster) in one request
+@app.put("/api/grades/bulk", response_model=schemas.GradeBulkResponse)
+def bulk_update_grades(
+    bulk_update: schemas.GradeBulkUpdate,
+    user: Principal = Depends(get_principal),
+    db: Session = Depends(get_db)
+):
+    # Verify user has permission (teacher or admin) once for the whole batch
+    check_permission(user, TEACHER_AND_ADMIN)
+
+    results = crud.bulk_upsert_grades(db, bulk_update.grades)
+    failed = sum(1 for r in results if r['status'] != 'ok')
+    return {
+        "updated": len(results) - failed,
+        "failed": failed,
+        "results": results
+    }
+
+# students may only follow their own grades; teachers/admins follow everyone or one student
+def _grade_changes_scope(user: Principal, student_id: Optional[int]):
+    if user.role == UserRole.STUDENT:
+        if student_id is not None and student_id != user.user_id:
+            raise HTTPException(status_code=403, detail="Not enough permissions")
+        return user.user_id
+    check_permission(user, TEACHER_AND_ADMIN)
+    return student_id
+
+# endpoint returning grade changes after the client's last sync cursor, oldest first
+@app.get("/api/grades/changes", response_model=schemas.GradeChangesResponse)
+def get_grade_changes(
+    since: int = Query(0, ge=0, description="Cursor returned by the previous sync"),
+    limit: int = Query(500, ge=1, le=5000),
+    student_id: Optional[int] = Query(None, description="Only changes for this student"),
+    user: Principal = Depends(get_principal),
+    db: Session = Depends(get_db)
+):
+    student_id = _grade_changes_scope(user, student_id)
+    changes = crud.get_grade_changes(db, since, limit, student_id)
+    return {
+        "changes": changes,
+        "cursor": changes[-1].change_id if changes else since,
+        "has_more": len(changes) == limit
+    }
+
+# Server-Sent Events stream of grade changes, resuming from Last-Event-ID after a reconnect
+@app.get("/api/grades/changes/stream")
+async def stream_grade_changes(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0, description="Cursor to resume from, defaults to now"),
+    student_id: Optional[int] = Query(None, description="Only changes for this student"),
+    user: Principal = Depends(get_principal),
+    db: Session = Depends(get_db)
+):
+    student_id = _grade_changes_scope(user, student_id)
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        since = int(last_event_id)
+    elif since is None:
+        since = await run_in_threadpool(crud.get_latest_change_id, db)
+
+    # poll the log, ending the transaction after each poll so no connection is held while idle
+    def poll(cursor):
+        try:
+            return crud.get_grade_changes(db, cursor, CHANGE_STREAM_BATCH_SIZE, student_id)
+        finally:
+            db.rollback()
+
+    async def events():
+        cursor = since
+        yield "retry: %d\n\n" % int(CHANGE_STREAM_POLL_SECONDS * 1000)
+        while not await request.is_disconnected():
+            changes = await run_in_threadpool(poll, cursor)
+            for change in changes:
+                data = schemas.GradeChangeEntry.model_validate(change._asdict()).model_dump_json()
+                yield "id: %d\ndata: %s\n\n" % (change.change_id, data)
+                cursor = change.change_id
+            if len(changes) < CHANGE_STREAM_BATCH_SIZE:
+                await asyncio.sleep(CHANGE_STREAM_POLL_SECONDS)
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Teacher/Admin endpoint returning class averages and grade distributions per subject,
+# answered from the precomputed statistics in O(subjects)
+@app.get("/api/stats", response_model=schemas.StatsResponse)
+def get_stats(user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
+    check_permission(user, TEACHER_AND_ADMIN)
+    return {"subjects": stats.subject_stats(db, crud.get_all_subjects(db))}
+
+# endpoint returning a student's GPA and grade distribution, for teachers/admins or the student
+@app.get("/api/stats/student/{student_id}", response_model=schemas.StudentStats)
+def get_student_stats(student_id: int, user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
+    if user.user_id != student_id:
+        check_permission(user, TEACHER_AND_ADMIN)
+    return stats.student_stats(db, student_id)
+
+# Teacher/Admin endpoint streaming every student's report card as a zip archive
+@app.get("/api/reports/cards/export")
+def export_report_cards(
+    fmt: str = Query("pdf", alias="format", pattern="^(csv|pdf)$"),
+    user: Principal = Depends(get_principal),
+    db: Session = Depends(get_db)
+):
+    check_permission(user, TEACHER_AND_ADMIN)
+    return StreamingResponse(
+        reports.iter_export(db, fmt),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="report_cards_{fmt}.zip"'}
+    )
+
+# endpoint returning one student's report card as CSV or PDF, for teachers/admins or the student
+@app.get("/api/reports/cards/{student_id}")
+def get_report_card(
+    student_id: int,
+    fmt: str = Query("pdf", alias="format", pattern="^(csv|pdf)$"),
+    user: Principal = Depends(get_principal),
+    db: Session = Depends(get_db)
+):
+    if user.user_id != student_id:
+        check_permission(user, TEACHER_AND_ADMIN)
+    card = reports.get_card(db, student_id, fmt)
+    if card is None:
+        raise HTTPException(status_code=404, detail="Student not found")
+    name, document = card
+    return Response(
+        document.encode("utf-8"),
+        media_type=reports.FORMATS[fmt][0],
+        headers={"Content-Disposition": f'attachment; filename="{name}"'}
+    )
+
 # endpoint returning list of subjects available in the system
 @app.get("/api/subjects", response_model=List[schemas.SubjectResponse])
-def list_subjects(db: Session = Depends(get_db)):
-    return crud.get_all_subjects(db)
+def list_subjects(request: Request, db: Session = Depends(get_db)):
+    subjects, etag = crud.get_subject_catalog(db)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return FastJSONResponse(row_dicts(subjects), headers={"ETag": etag})
 
 #  edpoint for admin to add or remove subjects
 @app.post("/api/subjects", response_model=schemas.SubjectResponse)
-def add_subject(subject: schemas.SubjectBase, user_id: int, db: Session = Depends(get_db)):
+def add_subject(subject: schemas.SubjectBase, user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
     # Verify user is admin
-    user = db.query(models.User).filter(models.User.user_id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
     check_permission(user, ADMIN_ONLY)
     
     return crud.create_subject(db, subject.subject_name)
 
 # delete subject endpoint for admin users and cascading delete associated grades
-@app.delete("/api/subjects/{subject_id}")
-def remove_subject(subject_id: int, user_id: int, db: Session = Depends(get_db)):
+@app.delete("/api/subjects/{subject_id}", status_code=202)
+def remove_subject(subject_id: int, user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
     # Verify user is admin
-    user = db.query(models.User).filter(models.User.user_id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
     check_permission(user, ADMIN_ONLY)
     
-    if crud.delete_subject(db, subject_id):
-        return {"message": "Subject deleted successfully"}
-    raise HTTPException(status_code=404, detail="Subject not found")
+    if db.get(models.Subject, subject_id) is None:
+        raise HTTPException(status_code=404, detail="Subject not found")
+    # the subject's grades are deleted in batches by a background job
+    job = jobs.enqueue(db, jobs.DELETE_SUBJECT, subject_id)
+    return {"message": "Subject deletion queued", "job_id": job.job_id, "status": job.status}
 
 # endpoint for admin to create new users
 @app.post("/api/users", response_model=schemas.UserResponse)
-def create_user(user_create: schemas.UserCreate, user_id: int=Query(...), db: Session = Depends(get_db)):
+def create_user(user_create: schemas.UserCreate, user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
     # Verify user is admin
-    user = db.query(models.User).filter(models.User.user_id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
     check_permission(user, ADMIN_ONLY)
 
     existing_user = crud.get_user_by_email(db, user_create.email)
@@ -150,38 +380,102 @@ def create_user(user_create: schemas.UserCreate, user_id: int=Query(...), db: Se
 
 # endpoint for admin to return the list of all users
 @app.get("/api/users", response_model=List[schemas.UserResponse])
-def list_users(user_id: int, db: Session = Depends(get_db)):
+def list_users(
+    after: int = Query(0, ge=0, description="Return users with user_id greater than this"),
+    limit: int = Query(100, ge=1, le=crud.MAX_PAGE_SIZE),
+    role: Optional[str] = Query(None, description="Only users with this role"),
+    name: Optional[str] = Query(None, description="Full name prefix"),
+    user: Principal = Depends(get_principal),
+    db: Session = Depends(get_db)
+):
     # Verify user is admin
-    user = db.query(models.User).filter(models.User.user_id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
     check_permission(user, ADMIN_ONLY)
+    if role is not None and role not in ALL_ROLES:
+        raise HTTPException(status_code=400, detail="Invalid role")
     
-    return db.query(models.User).all()
+    users, next_after = crud.list_users(db, role, name, after, limit)
+    headers = {"X-Next-Cursor": str(next_after)} if next_after is not None else None
+    return FastJSONResponse(row_dicts(users), headers=headers)
+
+# endpoint for admin to bulk import users or grades from a CSV request body (see app/importer.py)
+@app.post("/api/import/{kind}")
+async def import_data(
+    kind: str,
+    request: Request,
+    user: Principal = Depends(get_principal),
+    db: Session = Depends(get_db)
+):
+    check_permission(user, ADMIN_ONLY)
+    if kind not in importer.IMPORT_KINDS:
+        raise HTTPException(status_code=404, detail="Unknown import kind")
+
+    # spool the upload to disk past 1 MB instead of holding it in memory
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    spool.seek(0)
+    stream = io.TextIOWrapper(spool, encoding="utf-8-sig", newline="")
+    try:
+        return await run_in_threadpool(importer.import_csv, db, kind, stream)
+    finally:
+        stream.close()
 
 #delete user endpoint for admin users and cascading delete associated grades
-@app.delete("/api/users/{delete_user_id}")
+@app.delete("/api/users/{delete_user_id}", status_code=202)
 def delete_user(
     delete_user_id: int,
-    user_id: int = Query(..., description="Admin user id"),
+    admin: Principal = Depends(get_principal),
     db: Session = Depends(get_db)
 ):
-    admin = db.query(models.User).filter(
-        models.User.user_id == user_id
-    ).first()
-
-    if not admin:
-        raise HTTPException(status_code=401, detail="User not found")
-
     check_permission(admin, ADMIN_ONLY)
 
-    if not crud.delete_user(db, delete_user_id):
+    if db.get(models.User, delete_user_id) is None:
         raise HTTPException(status_code=404, detail="User not found")
+    # the user's grades are deleted in batches by a background job
+    job = jobs.enqueue(db, jobs.DELETE_USER, delete_user_id)
+    return {"message": "User deletion queued", "job_id": job.job_id, "status": job.status}
+
+# endpoint for admin to poll a background job (subject or user deletion)
+@app.get("/api/jobs/{job_id}", response_model=schemas.JobResponse)
+def get_job(job_id: int, user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
+    check_permission(user, ADMIN_ONLY)
+    job = jobs.get_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 
-    return {"message": "User deleted successfully"}
+# endpoint for admin to inspect principal cache size and per-endpoint hit rates
+@app.get("/api/cache/principals")
+def get_principal_cache_stats(user: Principal = Depends(get_principal)):
+    check_permission(user, ADMIN_ONLY)
+    return principal_cache_stats()
+
+
+# Prometheus scrape endpoint with pool checkout-wait and query-time histograms
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    if ratelimit.RATE_LIMIT_ENABLED:
+        return render_metrics() + "\n".join(ratelimit.render_metrics()) + "\n"
+    return render_metrics()
 
 
 # Basic root endpoint
 @app.get("/")
 def root():
-    return {"message": "Grade Entry System API"}
\ No newline at end of file
+    return {"message": "Grade Entry System API"}
+
+# liveness probe: the worker is up and serving, independent of the database
+@app.get("/health/live")
+def liveness():
+    return {"status": "alive"}
+
+# readiness probe: 503 until the database (and shared cache, if any) can be reached
+@app.get("/health/ready")
+async def readiness():
+    checks = await health.readiness_checks()
+    ready = all(error is None for error in checks.values())
+    return FastJSONResponse(
+        {"status": "ready" if ready else "unavailable", "checks": checks},
+        status_code=200 if ready else 503
+    )
\ No newline at end of file
@@ -0,0 +1,105 @@
+# Connection pool and query timing metrics, collected through SQLAlchemy events and
+# rendered in the Prometheus text format by the /metrics endpoint
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# seconds, from sub-millisecond queries up to the default 30s pool timeout
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+# cumulative histogram with fixed upper bounds
+class Histogram:
+    def __init__(self, name: str, description: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def render(self):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        cumulative += counts[-1]
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {cumulative}')
+        lines.append(f"{self.name}_sum {total}")
+        lines.append(f"{self.name}_count {cumulative}")
+        return lines
+
+
+pool_checkout_wait = Histogram("db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection")
+query_duration = Histogram("db_query_duration_seconds", "Time spent executing a single SQL statement")
+_engines = []
+
+
+# QueuePool that records how long each checkout waited for a connection
+class TimedQueuePool(QueuePool):
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - start)
+
+
+class TimedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - start)
+
+
+# statements on one connection never overlap, so a single start time is enough; a failed
+# statement (no after_cursor_execute) leaves it to be overwritten by the next one
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.pop("query_start", None)
+    if start is not None:
+        query_duration.observe(time.perf_counter() - start)
+
+
+# attach query timing to a (sync) engine and report its pool state
+def instrument_engine(engine, label: str):
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    _engines.append((label, engine))
+
+
+def _pool_gauges():
+    lines = ["# HELP db_pool_connections Connections in the pool by state", "# TYPE db_pool_connections gauge"]
+    for label, engine in _engines:
+        pool = engine.pool
+        if not isinstance(pool, QueuePool):
+            continue
+        lines.append(f'db_pool_connections{{engine="{label}",state="checked_out"}} {pool.checkedout()}')
+        lines.append(f'db_pool_connections{{engine="{label}",state="checked_in"}} {pool.checkedin()}')
+        lines.append(f'db_pool_connections{{engine="{label}",state="overflow"}} {max(pool.overflow(), 0)}')
+        lines.append(f'db_pool_connections{{engine="{label}",state="size"}} {pool.size()}')
+    return lines
+
+
+# all metrics in the Prometheus text exposition format
+def render_metrics() -> str:
+    lines = pool_checkout_wait.render() + query_duration.render() + _pool_gauges()
+    return "\n".join(lines) + "\n"
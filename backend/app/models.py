@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DECIMAL, ForeignKey, DateTime, Enum
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Enum, UniqueConstraint, Index, event, func, insert, select
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -6,6 +6,11 @@ from .database import Base
 # user table to store user information
 class User(Base):
     __tablename__ = "users"
+    # match the indexes in database/schema.sql used by the paginated user and student listings
+    __table_args__ = (
+        Index("idx_users_role_user_id", "role", "user_id"),
+        Index("idx_users_full_name", "full_name"),
+    )
     user_id = Column(Integer, primary_key=True, index=True)
     username = Column(String(50), unique=True, nullable=False)
     password = Column(String(255), nullable=False)
@@ -14,7 +19,8 @@ class User(Base):
     role = Column(Enum('admin', 'teacher', 'student'), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     
-    grades = relationship("Grade", back_populates="student", foreign_keys="Grade.student_id", cascade="all, delete-orphan")
+    grades = relationship("Grade", back_populates="student", foreign_keys="Grade.student_id", cascade="all, delete-orphan",
+                          passive_deletes=True)
 
 # subject table to store subject information
 class Subject(Base):
@@ -32,12 +38,83 @@ class Subject(Base):
 # grade table to store grades for students in subjects
 class Grade(Base):
     __tablename__ = "grades"
+    # matches unique_student_subject in database/schema.sql, used as the upsert conflict target
+    __table_args__ = (UniqueConstraint("student_id", "subject_id", name="unique_student_subject"),)
     
     grade_id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
     subject_id = Column(Integer, ForeignKey("subjects.subject_id", ondelete="CASCADE"), nullable=False)
-    grade_value = Column(DECIMAL(5, 2))
+    grade_value = Column(String(2))  # letter grade, matches VARCHAR(2) in database/schema.sql
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     student = relationship("User", back_populates="grades", foreign_keys=[student_id])
-    subject = relationship("Subject", back_populates="grades")
\ No newline at end of file
+    subject = relationship("Subject", back_populates="grades")
+
+# precomputed grade statistics, maintained incrementally by crud (see app/stats.py)
+# count_* hold the number of each letter grade, points_total the sum of grade points
+class _GradeStatsColumns:
+    count_a = Column(Integer, nullable=False, default=0)
+    count_b = Column(Integer, nullable=False, default=0)
+    count_c = Column(Integer, nullable=False, default=0)
+    count_d = Column(Integer, nullable=False, default=0)
+    count_e = Column(Integer, nullable=False, default=0)
+    count_f = Column(Integer, nullable=False, default=0)
+    graded_count = Column(Integer, nullable=False, default=0)
+    points_total = Column(Integer, nullable=False, default=0)
+
+# grade statistics per subject
+class SubjectGradeStats(_GradeStatsColumns, Base):
+    __tablename__ = "subject_grade_stats"
+    subject_id = Column(Integer, ForeignKey("subjects.subject_id", ondelete="CASCADE"), primary_key=True)
+
+# grade statistics per student
+class StudentGradeStats(_GradeStatsColumns, Base):
+    __tablename__ = "student_grade_stats"
+    student_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True)
+
+
+# append-only log of grade changes, change_id is the sync cursor handed to clients.
+# change_ids are taken from GradeChangeSequence at commit time (see crud), so they become
+# visible in increasing order.
+class GradeChange(Base):
+    __tablename__ = "grade_changes"
+    __table_args__ = (Index("idx_grade_changes_student", "student_id", "change_id"),)
+
+    change_id = Column(Integer, primary_key=True, autoincrement=True)
+    student_id = Column(Integer, nullable=False)
+    subject_id = Column(Integer, nullable=False)
+    grade_value = Column(String(2))
+    changed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+# single row (id 1) holding the last change_id handed out; writers lock it from taking
+# their ids until they commit
+class GradeChangeSequence(Base):
+    __tablename__ = "grade_change_sequence"
+
+    id = Column(Integer, primary_key=True)
+    last_change_id = Column(Integer, nullable=False, default=0)
+
+# create_all seeds the row like schema.sql does, continuing after any entries already logged
+@event.listens_for(Base.metadata, "after_create")
+def _seed_grade_change_sequence(metadata, connection, tables=(), **kw):
+    if GradeChangeSequence.__table__ in tables:
+        connection.execute(insert(GradeChangeSequence).from_select(
+            ["id", "last_change_id"],
+            select(1, func.coalesce(func.max(GradeChange.change_id), 0))
+        ))
+
+# background job for heavy admin operations (see app/jobs.py), polled through /api/jobs/{job_id}
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (Index("idx_jobs_status", "status", "job_id"),)
+
+    job_id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String(32), nullable=False)
+    target_id = Column(Integer, nullable=False)
+    status = Column(Enum('queued', 'running', 'done', 'failed'), nullable=False, default='queued')
+    processed = Column(Integer, nullable=False, default=0)  # grades deleted so far
+    error = Column(String(255))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)  # refreshed by the running worker after every batch
+    finished_at = Column(DateTime)
@@ -0,0 +1,205 @@
+# Opt-in per-request profiling (PROFILING_ENABLED=true): counts SQL statements and DB time
+# per request, flags repeated identical statements (N+1 patterns), adds a Server-Timing
+# header and logs one structured line per request. With PROFILE_DIR set, a background
+# sampler records stacks while requests run past SLOW_REQUEST_MS and writes them as
+# folded stacks (flamegraph.pl / speedscope input) when the request ends.
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+
+logger = logging.getLogger("grade_api.profiling")
+
+
+# SQL activity of the request being handled
+class RequestProfile:
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = Counter()
+        self.samples = Counter()
+
+    # statements run at least N_PLUS_ONE_THRESHOLD times in this request
+    def repeated_statements(self):
+        return {sql: n for sql, n in self.statements.items() if n >= N_PLUS_ONE_THRESHOLD}
+
+
+_current = contextvars.ContextVar("request_profile", default=None)
+
+
+def current_profile():
+    return _current.get()
+
+
+# one start time per connection, as in app/metrics.py
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    if profile is not None:
+        conn.info["profile_start"] = time.perf_counter()
+        if _sampler:
+            _sampler.claim(profile)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.pop("profile_start", None)
+    profile = _current.get()
+    if profile is None:
+        return
+    if start is not None:
+        profile.db_time += time.perf_counter() - start
+    profile.queries += 1
+    profile.statements[statement] += 1
+
+
+# background thread sampling stacks while some request is slow. Only the threads running a
+# request's code are sampled for it: a thread is claimed by the request whose SQL it
+# executes (sync handlers and dependencies in the threadpool, async handlers on the event
+# loop) until another request claims it or the request ends.
+class StackSampler(threading.Thread):
+    def __init__(self, interval: float, slow_after: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+        self.slow_after = slow_after
+        self._active = set()
+        # thread ident -> profile of the request running on that thread
+        self._owners = {}
+        self._lock = threading.Lock()
+
+    def track(self, profile: RequestProfile):
+        with self._lock:
+            self._active.add(profile)
+
+    # mark the calling thread as running profile's request
+    def claim(self, profile: RequestProfile):
+        ident = threading.get_ident()
+        if self._owners.get(ident) is not profile:
+            with self._lock:
+                self._owners[ident] = profile
+
+    def untrack(self, profile: RequestProfile):
+        with self._lock:
+            self._active.discard(profile)
+            for ident in [i for i, owner in self._owners.items() if owner is profile]:
+                del self._owners[ident]
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            self.sample()
+
+    # add the current stack of every thread running a slow request to its profile
+    def sample(self):
+        now = time.perf_counter()
+        with self._lock:
+            slow = {p for p in self._active if now - p.start >= self.slow_after}
+            owners = [(ident, p) for ident, p in self._owners.items() if p in slow]
+        if owners:
+            frames = sys._current_frames()
+            for ident, profile in owners:
+                frame = frames.get(ident)
+                if frame is not None:
+                    profile.samples[";".join(
+                        f"{f.name} ({os.path.basename(f.filename)}:{f.lineno})"
+                        for f in traceback.extract_stack(frame)
+                    )] += 1
+
+
+_sampler = None
+
+
+def _write_profile(profile: RequestProfile, duration_ms: float):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{profile.method}-{profile.path.strip('/').replace('/', '_') or 'root'}-{int(duration_ms)}ms.folded"
+    with open(os.path.join(PROFILE_DIR, name), "w") as f:
+        for stack, count in profile.samples.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+# pure ASGI middleware, so the profile contextvar is visible to sync handlers in the threadpool
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+        global _sampler
+        if PROFILE_DIR and _sampler is None:
+            _sampler = StackSampler(PROFILE_INTERVAL_MS / 1000, SLOW_REQUEST_MS / 1000)
+            _sampler.start()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        profile = RequestProfile(scope["method"], scope["path"])
+        token = _current.set(profile)
+        if _sampler:
+            _sampler.track(profile)
+        status = 500
+        pending_start = None
+
+        # the response start is held back until the first body message: a complete body gets
+        # the Server-Timing header with the request's totals, a streamed one (more_body) goes
+        # out without it, its totals are only known in the end-of-request log line
+        async def send_with_timing(message):
+            nonlocal status, pending_start
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                pending_start = message
+                return
+            if pending_start is not None:
+                start, pending_start = pending_start, None
+                if message["type"] == "http.response.body" and not message.get("more_body", False):
+                    total_ms = (time.perf_counter() - profile.start) * 1000
+                    timing = (f'db;dur={profile.db_time * 1000:.1f};desc="{profile.queries} queries", '
+                              f'app;dur={total_ms:.1f}')
+                    start["headers"] = list(start.get("headers", [])) + [(b"server-timing", timing.encode())]
+                await send(start)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            if _sampler:
+                _sampler.untrack(profile)
+            self._report(profile, status)
+
+    def _report(self, profile: RequestProfile, status: int):
+        duration_ms = (time.perf_counter() - profile.start) * 1000
+        repeated = profile.repeated_statements()
+        record = {
+            "method": profile.method,
+            "path": profile.path,
+            "status": status,
+            "duration_ms": round(duration_ms, 2),
+            "db_ms": round(profile.db_time * 1000, 2),
+            "queries": profile.queries,
+        }
+        if repeated:
+            record["n_plus_one"] = [{"statement": sql, "count": n} for sql, n in repeated.items()]
+        slow = duration_ms >= SLOW_REQUEST_MS
+        if slow and profile.samples:
+            _write_profile(profile, duration_ms)
+        level = logging.WARNING if repeated or slow else logging.INFO
+        logger.log(level, json.dumps(record))
+
+
+# count statements of every engine, including ones created after this module is imported
+def install():
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
@@ -0,0 +1,221 @@
+# Rate limiting and admission control for the login, write and export paths (RATE_LIMIT_ENABLED=true).
+# Each Rule matches one route and combines
+#   - a token bucket per user_id (or client IP): rate tokens per second, at most burst saved up
+#   - a cap on requests in flight on this route in this worker (max_concurrent, 0 for none)
+# Requests over either limit are answered with 429 and Retry-After straight from the
+# middleware, before they reach a database session, instead of queueing on the pool.
+#
+# Buckets live in process memory by default; RATE_LIMIT_BACKEND=redis keeps them in the
+# Redis server of app/cache.py so all workers share one budget per user (one awaited
+# round trip per limited request, through redis.asyncio). Override a rule with RATE_LIMIT_<NAME>=rate,burst,max_concurrent.
+import inspect
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+from urllib.parse import parse_qsl
+
+from . import cache
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "false").lower() in ("1", "true", "yes")
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+# in-memory buckets kept per worker, the least recently used one is dropped beyond that
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+
+# limits of one route; key is "user" (user_id query parameter, the client IP when absent),
+# "ip", or "route" for one bucket shared by all callers
+class Rule(NamedTuple):
+    name: str
+    method: str
+    path: str
+    key: str
+    rate: float
+    burst: int
+    max_concurrent: int
+
+
+DEFAULT_RULES = [
+    Rule("login", "POST", "/api/auth/login", "ip", 2.0, 20, 16),
+    Rule("my_grades", "GET", "/api/grades/my-grades", "user", 1.0, 10, 32),
+    Rule("grade_write", "PUT", "/api/grades/student/{student_id}/subject/{subject_id}", "user", 10.0, 50, 0),
+    Rule("bulk_grades", "PUT", "/api/grades/bulk", "user", 2.0, 10, 8),
+    Rule("import", "POST", "/api/import/{kind}", "user", 0.1, 2, 2),
+    Rule("report_export", "GET", "/api/reports/cards/export", "user", 0.05, 2, 2),
+]
+
+
+# DEFAULT_RULES with the RATE_LIMIT_<NAME> overrides applied
+def load_rules(rules=DEFAULT_RULES):
+    loaded = []
+    for rule in rules:
+        override = os.getenv(f"RATE_LIMIT_{rule.name.upper()}")
+        if override:
+            rate, burst, max_concurrent = override.split(",")
+            rule = rule._replace(rate=float(rate), burst=int(burst), max_concurrent=int(max_concurrent))
+        loaded.append(rule)
+    return loaded
+
+
+# token buckets in process memory, at most max_keys of them in LRU order. Only touched
+# from the event loop, so no locking.
+class MemoryTokenBuckets:
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        # key -> [tokens, updated_at]
+        self._buckets = OrderedDict()
+
+    # take a token for key, returns 0.0 when allowed, else seconds until one is available
+    def take(self, key: str, rate: float, burst: int) -> float:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            self._buckets[key] = [burst - 1, now]
+            if len(self._buckets) > self.max_keys:
+                # an evicted caller starts over with a full bucket
+                self._buckets.popitem(last=False)
+            return 0.0
+        self._buckets.move_to_end(key)
+        tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        bucket[0], bucket[1] = tokens, now
+        return wait
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+# token bucket update run atomically in Redis, using the server clock so all workers agree
+_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((burst - tokens) / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+# token buckets shared by all workers through Redis; client is a redis.asyncio client,
+# so take is awaited and the round trip does not hold up the event loop
+class RedisTokenBuckets:
+    def __init__(self, client, prefix: str = cache.CACHE_PREFIX + "ratelimit:"):
+        self.prefix = prefix
+        self._take = client.register_script(_TAKE_SCRIPT)
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        return float(await self._take(keys=[self.prefix + key], args=[rate, burst]))
+
+
+def make_buckets():
+    if RATE_LIMIT_BACKEND == "redis":
+        return RedisTokenBuckets(cache.async_redis_client())
+    return MemoryTokenBuckets()
+
+
+_TOO_MANY_BODY = b'{"detail":"Too many requests"}'
+
+# per-rule counters of this worker, reported on /metrics
+in_flight = {}
+rejected = {}
+
+
+# Prometheus text lines for the counters
+def render_metrics():
+    lines = [
+        "# HELP rate_limit_rejected_total Requests answered with 429, by rule",
+        "# TYPE rate_limit_rejected_total counter",
+    ]
+    lines += [f'rate_limit_rejected_total{{rule="{name}"}} {count}' for name, count in rejected.items()]
+    lines += [
+        "# HELP rate_limit_in_flight Requests in flight on rate limited routes, by rule",
+        "# TYPE rate_limit_in_flight gauge",
+    ]
+    lines += [f'rate_limit_in_flight{{rule="{name}"}} {count}' for name, count in in_flight.items()]
+    return lines
+
+
+# pure ASGI middleware applying rules; unmatched routes pass through untouched
+class RateLimitMiddleware:
+    def __init__(self, app, rules=None, buckets=None):
+        self.app = app
+        rules = load_rules() if rules is None else rules
+        self.buckets = buckets if buckets is not None else make_buckets()
+        # memory buckets answer inline, shared ones are awaited
+        self._await_take = inspect.iscoroutinefunction(self.buckets.take)
+        self._exact = {(r.method, r.path): r for r in rules if "{" not in r.path}
+        self._templates = [
+            (r.method, re.compile("^" + re.sub(r"\{[^}]+\}", "[^/]+", r.path) + "$"), r)
+            for r in rules if "{" in r.path
+        ]
+        for rule in rules:
+            in_flight.setdefault(rule.name, 0)
+            rejected.setdefault(rule.name, 0)
+
+    def _match(self, method: str, path: str):
+        rule = self._exact.get((method, path))
+        if rule is None:
+            for rule_method, pattern, candidate in self._templates:
+                if rule_method == method and pattern.match(path):
+                    return candidate
+        return rule
+
+    @staticmethod
+    def _key(rule: Rule, scope) -> str:
+        if rule.key == "route":
+            return rule.name
+        if rule.key == "user":
+            for name, value in parse_qsl(scope["query_string"].decode("latin-1")):
+                if name == "user_id":
+                    return f"{rule.name}:u{value}"
+        client = scope.get("client")
+        return f"{rule.name}:{client[0] if client else 'unknown'}"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        rule = self._match(scope["method"], scope["path"])
+        if rule is None:
+            return await self.app(scope, receive, send)
+
+        if rule.rate > 0:
+            wait = self.buckets.take(self._key(rule, scope), rule.rate, rule.burst)
+            if self._await_take:
+                wait = await wait
+            if wait > 0:
+                return await self._reject(rule, send, wait)
+        if not rule.max_concurrent:
+            return await self.app(scope, receive, send)
+        if in_flight[rule.name] >= rule.max_concurrent:
+            return await self._reject(rule, send, 1)
+        in_flight[rule.name] += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            in_flight[rule.name] -= 1
+
+    async def _reject(self, rule: Rule, send, wait: float):
+        rejected[rule.name] += 1
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(_TOO_MANY_BODY)).encode()),
+                (b"retry-after", str(max(1, math.ceil(wait))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": _TOO_MANY_BODY})
@@ -0,0 +1,336 @@
+# Student report cards as CSV or PDF documents, one card or a whole-school zip export:
+#   python -m app.reports export cards.zip --format pdf
+# Students are processed REPORT_CHUNK_SIZE at a time. One query per chunk reads each
+# student's latest change_id in the grade change log, which grows with every grade write
+# and deletion; a card cached under the same change_id (and the same name and subject
+# catalog) is reused as is. The grades of the remaining students are loaded with one more
+# query and their cards are rendered inline, or in a pool of REPORT_WORKERS processes.
+# Exports are written to the zip archive chunk by chunk, so only one chunk of documents is
+# held in memory.
+import argparse
+import csv
+import io
+import math
+import multiprocessing
+import os
+import re
+import signal
+import threading
+import time
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import List, NamedTuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from . import crud, models
+from .cache import MISSING, compute_etag, make_cache
+from .stats import GRADE_POINTS
+
+REPORT_CHUNK_SIZE = int(os.getenv("REPORT_CHUNK_SIZE", "500"))
+# render processes, 0 (the default) renders in the calling thread; benchmarks.bench_reports
+# shows whether a pool pays off for the card format and core count at hand
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "0"))
+REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", "10000"))
+# cards of students nobody exports again are dropped after this long
+REPORT_CACHE_TTL = float(os.getenv("REPORT_CACHE_TTL", "3600"))
+# smaller batches are rendered in the calling thread, a process round trip costs more
+INLINE_RENDER_MAX = 16
+
+# format -> (media type, file extension)
+FORMATS = {"csv": ("text/csv", ".csv"), "pdf": ("application/pdf", ".pdf")}
+
+# format:student_id -> [stamp, document]
+report_cards = make_cache("report_card", REPORT_CACHE_SIZE, REPORT_CACHE_TTL)
+
+
+# what a card shows, plain values so it can be sent to the render processes
+class CardData(NamedTuple):
+    student_id: int
+    username: str
+    full_name: str
+    grades: list  # (subject_name, grade_value) in catalog order
+
+
+# GPA over the graded subjects, computed like app/stats.py's average_points
+def _gpa(grades: list):
+    points = [GRADE_POINTS[value] for _, value in grades if value in GRADE_POINTS]
+    return round(sum(points) / len(points), 2) if points else None
+
+
+def render_csv(card: CardData) -> str:
+    gpa = _gpa(card.grades)
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerows([
+        ["student_id", card.student_id],
+        ["username", card.username],
+        ["full_name", card.full_name],
+        [],
+        ["subject", "grade"],
+        *([name, value or ""] for name, value in card.grades),
+        [],
+        ["gpa", "" if gpa is None else gpa],
+    ])
+    return out.getvalue()
+
+
+# byte (as a latin-1 char) -> PDF string literal escape, for the bytes that need one
+_PDF_ESCAPES = str.maketrans({
+    **{chr(byte): f"\\{byte:03o}" for byte in (*range(32), *range(127, 256))},
+    "\\": "\\\\", "(": "\\(", ")": "\\)",
+})
+
+
+# PDF string literal body in WinAnsi encoding, non-ASCII bytes as octal escapes
+def _pdf_text(value) -> str:
+    return str(value).encode("cp1252", "replace").decode("latin-1").translate(_PDF_ESCAPES)
+
+
+PDF_ROWS_PER_PAGE = 44
+
+
+# text-only PDF with the built-in Helvetica font: a title, then (label, value) rows in two
+# columns, split over A4 pages. The output is pure ASCII so it can be cached as text.
+def _pdf_document(title: str, rows: list) -> str:
+    pages = [rows[i:i + PDF_ROWS_PER_PAGE] for i in range(0, len(rows), PDF_ROWS_PER_PAGE)] or [[]]
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the pages are numbered
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    kids = []
+    for number, page in enumerate(pages, 1):
+        ops = [f"BT /F1 16 Tf 1 0 0 1 56 780 Tm ({_pdf_text(title)}) Tj /F1 11 Tf"]
+        if len(pages) > 1:
+            ops.append(f"1 0 0 1 480 780 Tm (Page {number}/{len(pages)}) Tj")
+        y = 750
+        for label, value in page:
+            ops.append(f"1 0 0 1 56 {y} Tm ({_pdf_text(label)}) Tj")
+            if value:
+                ops.append(f"1 0 0 1 360 {y} Tm ({_pdf_text(value)}) Tj")
+            y -= 16
+        ops.append("ET")
+        content = "\n".join(ops)
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    parts = ["%PDF-1.4\n"]
+    size = len(parts[0])
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        part = f"{number} 0 obj\n{body}\nendobj\n"
+        offsets.append(size)
+        parts.append(part)
+        size += len(part)
+    parts.append(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n")
+    parts += [f"{offset:010d} 00000 n \n" for offset in offsets]
+    parts.append(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{size}\n%%EOF\n")
+    return "".join(parts)
+
+
+def render_pdf(card: CardData) -> str:
+    gpa = _gpa(card.grades)
+    rows = [
+        ("Student", card.full_name),
+        ("Username", card.username),
+        ("Student ID", str(card.student_id)),
+        ("", ""),
+        ("Subject", "Grade"),
+        *((name, value or "-") for name, value in card.grades),
+        ("", ""),
+        ("GPA", "-" if gpa is None else f"{gpa:.2f}"),
+    ]
+    return _pdf_document("Report Card", rows)
+
+
+RENDERERS = {"csv": render_csv, "pdf": render_pdf}
+
+
+# render a batch of cards, runs in the pool processes
+def render_cards(fmt: str, cards: List[CardData]) -> List[str]:
+    render = RENDERERS[fmt]
+    return [render(card) for card in cards]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# Ctrl+C reaches the whole process group, the workers are stopped by shutdown() instead
+def _ignore_interrupts():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+# render pool, started on first use. Workers are spawned rather than forked so they do not
+# inherit (and close on exit) the parent's pooled database connections.
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    REPORT_WORKERS, mp_context=multiprocessing.get_context("spawn"), initializer=_ignore_interrupts
+                )
+    return _pool
+
+
+# stop the render pool, on shutdown
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+# documents of cards, in order; large batches are split evenly over the pool processes
+def render(fmt: str, cards: List[CardData]) -> List[str]:
+    if REPORT_WORKERS <= 0 or len(cards) <= INLINE_RENDER_MAX:
+        return render_cards(fmt, cards)
+    size = math.ceil(len(cards) / REPORT_WORKERS)
+    batches = [cards[i:i + size] for i in range(0, len(cards), size)]
+    return [document for batch in _get_pool().map(render_cards, repeat(fmt), batches) for document in batch]
+
+
+# per student: (user_id, username, full_name, latest change_id of their grades), the
+# change_id is read from idx_grade_changes_student
+def _card_stamps_select(*criteria):
+    last_change = (
+        select(func.max(models.GradeChange.change_id))
+        .where(models.GradeChange.student_id == models.User.user_id)
+        .scalar_subquery()
+    )
+    return (
+        select(models.User.user_id, models.User.username, models.User.full_name, last_change)
+        .where(models.User.role == 'student', *criteria)
+        .order_by(models.User.user_id)
+    )
+
+
+# grade rows of a chunk of students, in the shape crud._merge_student_grades expects
+def _card_grades_select(student_ids: list):
+    return select(
+        models.Grade.student_id, models.Grade.grade_id, models.Grade.subject_id, models.Grade.grade_value
+    ).where(models.Grade.student_id.in_(student_ids))
+
+
+def filename(student_id: int, username: str, fmt: str) -> str:
+    return f"{student_id}_{re.sub(r'[^A-Za-z0-9_.-]', '_', username)}{FORMATS[fmt][1]}"
+
+
+# (filename, document) for each row of _card_stamps_select, rendering only the students
+# whose grades, name or subject catalog changed since their card was cached
+def _cards(db: Session, fmt: str, rows: list, subjects: list, catalog_etag: str):
+    stamps = [compute_etag(catalog_etag, tuple(row)) for row in rows]
+    documents = []
+    for row, stamp in zip(rows, stamps):
+        entry = report_cards.get(f"{fmt}:{row.user_id}")
+        documents.append(entry[1] if entry is not MISSING and entry[0] == stamp else None)
+
+    missing = [i for i, document in enumerate(documents) if document is None]
+    if missing:
+        grades = defaultdict(list)
+        for grade in db.execute(_card_grades_select([rows[i].user_id for i in missing])):
+            grades[grade.student_id].append(grade)
+        cards = []
+        for i in missing:
+            user_id, username, full_name = rows[i][:3]
+            merged = crud._merge_student_grades(subjects, grades[user_id])
+            cards.append(CardData(user_id, username, full_name, [(g['subject_name'], g['grade_value']) for g in merged]))
+        for i, document in zip(missing, render(fmt, cards)):
+            documents[i] = document
+            report_cards.set(f"{fmt}:{rows[i].user_id}", [stamps[i], document])
+
+    for row, document in zip(rows, documents):
+        yield filename(row.user_id, row.username, fmt), document
+
+
+# (filename, document) of one student's card, None when there is no such student
+def get_card(db: Session, student_id: int, fmt: str):
+    rows = db.execute(_card_stamps_select(models.User.user_id == student_id)).all()
+    if not rows:
+        return None
+    subjects, catalog_etag = crud.get_subject_catalog(db)
+    return next(_cards(db, fmt, rows, subjects, catalog_etag))
+
+
+# (filename, document) of every student's card, ordered by user_id
+def iter_cards(db: Session, fmt: str, chunk_size: int = REPORT_CHUNK_SIZE):
+    subjects, catalog_etag = crud.get_subject_catalog(db)
+    after = 0
+    while True:
+        rows = db.execute(_card_stamps_select(models.User.user_id > after).limit(chunk_size)).all()
+        yield from _cards(db, fmt, rows, subjects, catalog_etag)
+        if len(rows) < chunk_size:
+            return
+        after = rows[-1].user_id
+
+
+# file object collecting what zipfile writes until it is taken; it has no tell() or
+# seek(), so zipfile writes each member's sizes after its data instead of seeking back
+class _ZipStream:
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+# zip archive of (filename, document) entries, yielded as bytes one member at a time
+def iter_zip(entries):
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, document in entries:
+            archive.writestr(name, document.encode("utf-8"))
+            yield stream.take()
+    yield stream.take()
+
+
+# zip archive of every student's card
+def iter_export(db: Session, fmt: str, chunk_size: int = REPORT_CHUNK_SIZE):
+    return iter_zip(iter_cards(db, fmt, chunk_size))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export student report cards")
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("path", help="Zip archive to write")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="pdf")
+    args = parser.parse_args(argv)
+
+    from .database import new_session
+
+    db = new_session()
+    start = time.perf_counter()
+    size = 0
+    try:
+        with open(args.path, "wb") as out:
+            for chunk in iter_export(db, args.format):
+                out.write(chunk)
+                size += len(chunk)
+    finally:
+        db.close()
+        shutdown()
+    print(f"Wrote {args.path} ({size} bytes) in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
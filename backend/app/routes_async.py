@@ -0,0 +1,153 @@
+# Async versions of the login, dashboard and grade endpoints, served through the async
+# engine when DB_ASYNC is enabled. main.py includes this router ahead of its own routes,
+# so these handlers take precedence for the same paths.
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from . import schemas, crud_async, security
+from .crud import MAX_PAGE_SIZE
+from .cache import compute_etag, etag_matches, not_modified
+from .serialization import FastJSONResponse, row_dict, row_dicts
+from .auth import Principal, check_permission, get_principal_async, lookup_principal_async
+from .database import get_async_db
+from .constants import UserRole, TEACHER_AND_ADMIN
+
+router = APIRouter()
+
+# Authentication endpoint validating user credentials and returning user info
+@router.post("/api/auth/login", response_model=schemas.UserResponse)
+async def login(user_login: schemas.UserLogin, db: AsyncSession = Depends(get_async_db)):
+    user = await crud_async.get_user_by_login(db, user_login.username)
+    stored = user.password if user else await security.dummy_hash_async()
+    valid = await security.verify_password_async(user_login.password, stored)
+    if not user or not valid:
+        raise HTTPException(status_code=401, detail="Invalid username or password")
+
+    # upgrade legacy plaintext or weaker hashes now that we know the password
+    if security.needs_rehash(user.password):
+        password_hash = await security.hash_password_async(user_login.password)
+        await crud_async.set_user_password(db, user.user_id, password_hash)
+    return user
+
+# teacher and admin endpoints returning list of students
+@router.get("/api/students", response_model=List[schemas.UserResponse])
+async def list_students(
+    after: int = Query(0, ge=0, description="Return students with user_id greater than this"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    name: Optional[str] = Query(None, description="Full name prefix"),
+    user: Principal = Depends(get_principal_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    check_permission(user, TEACHER_AND_ADMIN)
+    students, next_after = await crud_async.list_users(db, UserRole.STUDENT, name, after, limit)
+    headers = {"X-Next-Cursor": str(next_after)} if next_after is not None else None
+    return FastJSONResponse(row_dicts(students), headers=headers)
+
+# student endpoint returning their own grades
+@router.get("/api/grades/my-grades", response_model=schemas.StudentGradesResponse)
+async def get_my_grades(user_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    user = await lookup_principal_async(db, user_id, "GET /api/grades/my-grades")
+    if not user or user.role != UserRole.STUDENT:
+        raise HTTPException(status_code=403, detail="Only students can view their own grades")
+
+    grade_rows = await crud_async.get_student_grade_rows(db, user_id)
+    catalog_etag = (await crud_async.get_subject_catalog(db))[1]
+    etag = compute_etag(catalog_etag, tuple(user), [tuple(g) for g in grade_rows])
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    grades = await crud_async.get_student_grades(db, user_id, grade_rows)
+    return FastJSONResponse({
+        "student": row_dict(user),
+        "grades": grades
+    }, headers={"ETag": etag})
+
+# Teacher/Admin endpoint to get grades of a specific student
+@router.get("/api/grades/student/{student_id}", response_model=schemas.StudentGradesResponse)
+async def get_student_grades(
+    student_id: int,
+    request: Request,
+    user: Principal = Depends(get_principal_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    check_permission(user, TEACHER_AND_ADMIN)
+
+    student = await crud_async.get_student_by_id(db, student_id)
+    if not student:
+        raise HTTPException(status_code=404, detail="Student not found")
+
+    grade_rows = await crud_async.get_student_grade_rows(db, student_id)
+    catalog_etag = (await crud_async.get_subject_catalog(db))[1]
+    etag = compute_etag(
+        catalog_etag,
+        (student.user_id, student.username, student.full_name, student.email, student.role),
+        [tuple(g) for g in grade_rows]
+    )
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    grades = await crud_async.get_student_grades(db, student_id, grade_rows)
+    return FastJSONResponse({
+        "student": row_dict(student),
+        "grades": grades
+    }, headers={"ETag": etag})
+
+# Endpoint for teachers/admins to update a student's grade for a subject
+@router.put("/api/grades/student/{student_id}/subject/{subject_id}")
+async def update_student_grade(
+    student_id: int,
+    subject_id: int,
+    grade_update: schemas.GradeUpdate,
+    user: Principal = Depends(get_principal_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    check_permission(user, TEACHER_AND_ADMIN)
+    await crud_async.update_grade(db, student_id, subject_id, grade_update.grade_value)
+    return {"message": "Grade updated successfully"}
+
+# Endpoint for teachers/admins to update many grades in one request
+@router.put("/api/grades/bulk", response_model=schemas.GradeBulkResponse)
+async def bulk_update_grades(
+    bulk_update: schemas.GradeBulkUpdate,
+    user: Principal = Depends(get_principal_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    check_permission(user, TEACHER_AND_ADMIN)
+    results = await crud_async.bulk_upsert_grades(db, bulk_update.grades)
+    failed = sum(1 for r in results if r['status'] != 'ok')
+    return {
+        "updated": len(results) - failed,
+        "failed": failed,
+        "results": results
+    }
+
+# endpoint returning list of subjects available in the system
+@router.get("/api/subjects", response_model=List[schemas.SubjectResponse])
+async def list_subjects(request: Request, db: AsyncSession = Depends(get_async_db)):
+    subjects, etag = await crud_async.get_subject_catalog(db)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return FastJSONResponse(row_dicts(subjects), headers={"ETag": etag})
+
+# endpoint returning grade changes after the client's last sync cursor, oldest first
+@router.get("/api/grades/changes", response_model=schemas.GradeChangesResponse)
+async def get_grade_changes(
+    since: int = Query(0, ge=0, description="Cursor returned by the previous sync"),
+    limit: int = Query(500, ge=1, le=5000),
+    student_id: Optional[int] = Query(None, description="Only changes for this student"),
+    user: Principal = Depends(get_principal_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # students may only follow their own grades; teachers/admins follow everyone or one student
+    if user.role == UserRole.STUDENT:
+        if student_id is not None and student_id != user.user_id:
+            raise HTTPException(status_code=403, detail="Not enough permissions")
+        student_id = user.user_id
+    else:
+        check_permission(user, TEACHER_AND_ADMIN)
+    changes = await crud_async.get_grade_changes(db, since, limit, student_id)
+    return {
+        "changes": changes,
+        "cursor": changes[-1].change_id if changes else since,
+        "has_more": len(changes) == limit
+    }
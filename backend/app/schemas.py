@@ -1,5 +1,6 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from typing import Optional, List, Dict
+from datetime import datetime
 
 # User schemas for authentication and management
 class UserLogin(BaseModel):
@@ -58,4 +59,87 @@ class GradeResponse(BaseModel):
 # schema for student grades response
 class StudentGradesResponse(BaseModel):
     student: UserResponse
-    grades: List[GradeResponse]
\ No newline at end of file
+    grades: List[GradeResponse]
+
+# schemas for bulk grade updates #
+
+# one cell of a grade sheet or class roster
+class GradeBulkItem(BaseModel):
+    student_id: int
+    subject_id: int
+    grade_value: Optional[str]
+
+# schema for a bulk grade update request
+class GradeBulkUpdate(BaseModel):
+    grades: List[GradeBulkItem]
+
+# result for a single row of a bulk grade update
+class GradeBulkResult(BaseModel):
+    student_id: int
+    subject_id: int
+    status: str  # 'ok' or 'error'
+    detail: Optional[str] = None
+
+# schema for bulk grade update response
+class GradeBulkResponse(BaseModel):
+    updated: int
+    failed: int
+    results: List[GradeBulkResult]
+
+
+# grade statistics schemas #
+
+# statistics of one subject, distribution maps letter grade to count
+class SubjectStats(BaseModel):
+    subject_id: int
+    subject_name: str
+    graded: int
+    average_points: Optional[float]
+    distribution: Dict[str, int]
+
+# schema for class-wide statistics response
+class StatsResponse(BaseModel):
+    subjects: List[SubjectStats]
+
+# statistics and GPA of one student
+class StudentStats(BaseModel):
+    student_id: int
+    graded: int
+    gpa: Optional[float]
+    distribution: Dict[str, int]
+
+
+# grade change log schemas #
+
+# one logged grade change, grade_value is None when a grade was cleared
+class GradeChangeEntry(BaseModel):
+    change_id: int
+    student_id: int
+    subject_id: int
+    grade_value: Optional[str]
+    changed_at: datetime
+
+# schema for incremental sync, pass cursor back as since to get the next changes
+class GradeChangesResponse(BaseModel):
+    changes: List[GradeChangeEntry]
+    cursor: int
+    has_more: bool
+
+
+# background job schemas #
+
+# status of a background job, processed counts the grades deleted so far
+class JobResponse(BaseModel):
+    job_id: int
+    kind: str
+    target_id: int
+    status: str
+    processed: int
+    error: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    heartbeat_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
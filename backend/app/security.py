@@ -0,0 +1,76 @@
+# Password hashing and verification, with support for legacy plaintext passwords
+import asyncio
+import hashlib
+import hmac
+import os
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+
+# format stored in users.password: pbkdf2_sha256$<iterations>$<salt hex>$<hash hex>
+HASH_ALGORITHM = "pbkdf2_sha256"
+HASH_ITERATIONS = int(os.getenv("PASSWORD_HASH_ITERATIONS", "260000"))
+
+
+def _pbkdf2(password: str, salt: bytes, iterations: int) -> bytes:
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+
+
+# hash a password for storage
+def hash_password(password: str, iterations: int = None) -> str:
+    iterations = iterations or HASH_ITERATIONS
+    salt = secrets.token_bytes(16)
+    digest = _pbkdf2(password, salt, iterations)
+    return f"{HASH_ALGORITHM}${iterations}${salt.hex()}${digest.hex()}"
+
+
+def is_hashed(stored: str) -> bool:
+    return stored.startswith(HASH_ALGORITHM + "$")
+
+
+# check a password against a stored hash or a legacy plaintext value, CPU bound
+def verify_password(password: str, stored: str) -> bool:
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode(), stored.encode())
+    try:
+        _, iterations, salt, digest = stored.split("$")
+        expected = bytes.fromhex(digest)
+        actual = _pbkdf2(password, bytes.fromhex(salt), int(iterations))
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+# True for plaintext values and hashes made with fewer iterations than configured
+def needs_rehash(stored: str) -> bool:
+    if not is_hashed(stored):
+        return True
+    try:
+        return int(stored.split("$")[1]) < HASH_ITERATIONS
+    except (IndexError, ValueError):
+        return True
+
+
+# Hashing is kept off the event loop in a dedicated, bounded pool so slow hashes cannot
+# starve the threadpool that serves other (sync) endpoints
+LOGIN_HASH_WORKERS = int(os.getenv("LOGIN_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+_hash_pool = ThreadPoolExecutor(max_workers=LOGIN_HASH_WORKERS, thread_name_prefix="password-hash")
+
+
+_dummy_hash = None
+
+
+# hash of a random password, verified against when the login name is unknown so
+# unknown users cost the same time as wrong passwords; built in the hash pool on first use
+async def dummy_hash_async() -> str:
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = await hash_password_async(secrets.token_hex(16))
+    return _dummy_hash
+
+
+async def verify_password_async(password: str, stored: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(_hash_pool, verify_password, password, stored)
+
+
+async def hash_password_async(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_hash_pool, hash_password, password)
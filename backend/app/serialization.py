@@ -0,0 +1,68 @@
+# Lean JSON responses for the read-heavy endpoints. Rows from column-only selects are
+# turned into plain dicts and encoded in one pass (with orjson when installed) instead of
+# being validated into response models and walked again by jsonable_encoder.
+# Endpoints returning these keep their response_model for the OpenAPI docs; FastAPI does
+# not validate responses that are returned as Response objects.
+import json
+import os
+from datetime import date, datetime
+from fastapi.responses import JSONResponse
+from starlette.middleware.gzip import GZipMiddleware
+
+try:
+    import orjson
+except ImportError:  # optional, the standard library encoder is used without it
+    orjson = None
+
+# responses smaller than this are sent uncompressed
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+# encode content to compact JSON bytes
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+# JSON response rendered with dumps, also used as the app's default response class
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+# rows (or named tuples) as a list of dicts keyed by column name
+def row_dicts(rows) -> list:
+    if not rows:
+        return []
+    fields = rows[0]._fields
+    return [dict(zip(fields, row)) for row in rows]
+
+
+# one row (or named tuple) as a dict keyed by column name
+def row_dict(row) -> dict:
+    return dict(zip(row._fields, row))
+
+
+# paths never compressed: Server-Sent Events streams must be flushed event by event and
+# zip exports are compressed already
+_UNCOMPRESSED_SUFFIXES = ("/stream", "/export")
+
+
+# gzip responses above GZIP_MIN_SIZE, except the _UNCOMPRESSED_SUFFIXES paths
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = GZIP_MIN_SIZE):
+        self.app = app
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].endswith(_UNCOMPRESSED_SUFFIXES):
+            await self.app(scope, receive, send)
+        else:
+            await self.gzip(scope, receive, send)
@@ -0,0 +1,44 @@
+# Production launcher: uvicorn with a pre-forked worker process per CPU core
+#   python -m app.serve                      (from backend/)
+# WEB_CONCURRENCY overrides the number of workers, HOST/PORT the bind address.
+# Every worker has its own engine, connection pool and job threads, so size DB_POOL_SIZE
+# per worker; run with CACHE_BACKEND=redis so cached principals and the subject catalog
+# stay consistent across workers.
+import argparse
+import logging
+import os
+
+import uvicorn
+
+from .cache import CACHE_BACKEND
+
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+
+logger = logging.getLogger("grade_api.serve")
+# seconds a worker gets to finish in-flight requests on shutdown
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the API with several worker processes")
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args(argv)
+
+    if args.workers > 1 and CACHE_BACKEND != "redis":
+        logger.warning("CACHE_BACKEND is not redis, each of the %d workers keeps its own caches", args.workers)
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+        proxy_headers=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
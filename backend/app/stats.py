@@ -0,0 +1,138 @@
+# Precomputed per-subject and per-student grade statistics.
+# crud applies deltas in the same transaction as every grade change; rebuild() recomputes
+# everything from the grades table:
+#   python -m app.stats rebuild
+import argparse
+from collections import defaultdict
+
+from sqlalchemy import case, delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from . import models
+
+# grade points used for class averages and GPA
+GRADE_POINTS = {'A': 4, 'B': 3, 'C': 2, 'D': 1, 'E': 0, 'F': 0}
+GRADE_COLUMNS = {grade: f"count_{grade.lower()}" for grade in GRADE_POINTS}
+STAT_COLUMNS = [*GRADE_COLUMNS.values(), "graded_count", "points_total"]
+
+# (model, key column name, grades column it aggregates over)
+_SCOPES = (
+    (models.SubjectGradeStats, "subject_id", models.Grade.subject_id),
+    (models.StudentGradeStats, "student_id", models.Grade.student_id),
+)
+
+
+def _add(deltas: dict, grade_value, sign: int):
+    if grade_value not in GRADE_POINTS:
+        # ungraded (None or '') and unknown values are not counted
+        return
+    deltas[GRADE_COLUMNS[grade_value]] += sign
+    deltas["graded_count"] += sign
+    deltas["points_total"] += sign * GRADE_POINTS[grade_value]
+
+
+# column deltas per subject and per student for (student_id, subject_id, old, new) changes
+def grade_change_deltas(changes):
+    subject_deltas = defaultdict(lambda: defaultdict(int))
+    student_deltas = defaultdict(lambda: defaultdict(int))
+    for student_id, subject_id, old_value, new_value in changes:
+        if old_value == new_value:
+            continue
+        for deltas in (subject_deltas[subject_id], student_deltas[student_id]):
+            _add(deltas, old_value, -1)
+            _add(deltas, new_value, 1)
+    return subject_deltas, student_deltas
+
+
+# atomic "insert or add to" statement for one stats table
+def _stats_upsert_statement(dialect: str, model, key: str, rows: list):
+    table = model.__table__
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        stmt = dialect_insert(table).values(rows)
+        return stmt.on_duplicate_key_update({c: table.c[c] + stmt.inserted[c] for c in STAT_COLUMNS})
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    stmt = dialect_insert(table).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[key],
+        set_={c: table.c[c] + stmt.excluded[c] for c in STAT_COLUMNS}
+    )
+
+
+# statements applying the deltas of changes, empty when nothing graded changed. Every writer
+# locks the stats rows in the same order (subject table first, then ascending ids), so two
+# concurrent bulk writes over overlapping subjects or students cannot deadlock on MySQL.
+def stats_statements(dialect: str, changes):
+    statements = []
+    for (model, key, _), deltas in zip(_SCOPES, grade_change_deltas(changes)):
+        rows = [
+            {key: scope_id, **{c: d.get(c, 0) for c in STAT_COLUMNS}}
+            for scope_id, d in sorted(deltas.items()) if any(d.values())
+        ]
+        if rows:
+            statements.append(_stats_upsert_statement(dialect, model, key, rows))
+    return statements
+
+
+# recompute all statistics from the grades table
+def rebuild(db: Session):
+    grade = models.Grade.grade_value
+    aggregates = [
+        *(func.sum(case((grade == g, 1), else_=0)) for g in GRADE_COLUMNS),
+        func.sum(case((grade.in_(list(GRADE_POINTS)), 1), else_=0)),
+        func.sum(case(*((grade == g, p) for g, p in GRADE_POINTS.items()), else_=0)),
+    ]
+    for model, key, column in _SCOPES:
+        db.execute(delete(model))
+        db.execute(insert(model).from_select(
+            [key, *STAT_COLUMNS],
+            select(column, *aggregates).group_by(column)
+        ))
+    db.commit()
+
+
+def summarize(row) -> dict:
+    graded = row.graded_count if row else 0
+    return {
+        "graded": graded,
+        "average_points": round(row.points_total / graded, 2) if graded else None,
+        "distribution": {g: (getattr(row, c) if row else 0) for g, c in GRADE_COLUMNS.items()},
+    }
+
+
+# statistics of every subject in subjects (catalog entries), one stats query
+def subject_stats(db: Session, subjects):
+    rows = {r.subject_id: r for r in db.scalars(select(models.SubjectGradeStats))}
+    return [
+        {"subject_id": s.subject_id, "subject_name": s.subject_name, **summarize(rows.get(s.subject_id))}
+        for s in subjects
+    ]
+
+
+# statistics and GPA of one student
+def student_stats(db: Session, student_id: int):
+    row = db.get(models.StudentGradeStats, student_id)
+    summary = summarize(row)
+    return {"student_id": student_id, "gpa": summary.pop("average_points"), **summary}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain precomputed grade statistics")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args(argv)
+
+    from .database import new_session
+
+    db = new_session()
+    try:
+        rebuild(db)
+    finally:
+        db.close()
+    print("Grade statistics rebuilt")
+
+
+if __name__ == "__main__":
+    main()
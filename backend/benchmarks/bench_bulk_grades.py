@@ -0,0 +1,57 @@
+# Compare per-cell crud.update_grade against crud.bulk_upsert_grades for a full class roster
+#   python -m benchmarks.bench_bulk_grades --students 40 --subjects 12
+import argparse
+
+# common must be imported before app, it provides the DB_* settings database.py needs
+from .common import make_sessionmaker, seed, timed
+from app import crud, models, schemas
+
+GRADES = ["A", "B", "C", "D", "E"]
+
+
+def roster(student_ids, subject_ids, offset):
+    return [
+        schemas.GradeBulkItem(student_id=st, subject_id=su, grade_value=GRADES[(st + su + offset) % len(GRADES)])
+        for st in student_ids for su in subject_ids
+    ]
+
+
+def per_cell(db, items):
+    for item in items:
+        crud.update_grade(db, item.student_id, item.subject_id, item.grade_value)
+
+
+def report(label, cells, slow, fast):
+    print(f"{label:>6}: {cells} cells  per-cell {slow * 1000:8.1f} ms  "
+          f"bulk {fast * 1000:8.1f} ms  speedup {slow / fast:5.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=40)
+    parser.add_argument("--subjects", type=int, default=12)
+    args = parser.parse_args()
+
+    Session = make_sessionmaker()
+    db = Session()
+    student_ids, subject_ids = seed(db, args.students, args.subjects)
+    cells = len(student_ids) * len(subject_ids)
+
+    # insert pass starts from an empty grades table each time
+    db.query(models.Grade).delete()
+    db.commit()
+    slow = timed(per_cell, db, roster(student_ids, subject_ids, 0))
+    db.query(models.Grade).delete()
+    db.commit()
+    fast = timed(crud.bulk_upsert_grades, db, roster(student_ids, subject_ids, 0))
+    report("insert", cells, slow, fast)
+
+    # update pass overwrites every existing cell with a new value
+    slow = timed(per_cell, db, roster(student_ids, subject_ids, 1))
+    fast = timed(crud.bulk_upsert_grades, db, roster(student_ids, subject_ids, 2))
+    report("update", cells, slow, fast)
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
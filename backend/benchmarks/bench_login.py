@@ -0,0 +1,57 @@
+# Login throughput and latency at a fixed concurrency, driving the ASGI app in-process
+#   python -m benchmarks.bench_login --concurrency 16 --requests 400
+import argparse
+import asyncio
+import time
+
+# common must be imported before app, it provides the DB_* settings database.py needs
+from .common import asgi_request, make_sessionmaker, percentile, seed, use_sessionmaker
+from app.main import app
+
+
+async def run(concurrency, total, users):
+    latencies = []
+    statuses = {}
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i % users)
+
+    async def client():
+        while not queue.empty():
+            i = queue.get_nowait()
+            start = time.perf_counter()
+            status, _, _ = await asgi_request(
+                app, "POST", "/api/auth/login",
+                body={"username": f"student{i}", "password": "student123"}
+            )
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - start, sorted(latencies), statuses
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--users", type=int, default=50)
+    args = parser.parse_args()
+
+    Session = make_sessionmaker()
+    db = Session()
+    seed(db, args.users, 0)
+    db.close()
+    use_sessionmaker(app, Session)
+
+    # first round logs in against plaintext passwords and rehashes them, second verifies hashes
+    for label, total in (("legacy+rehash", args.users), ("hashed", args.requests)):
+        elapsed, latencies, statuses = asyncio.run(run(args.concurrency, total, args.users))
+        print(f"{label:>13}: {len(latencies)} logins at concurrency {args.concurrency}  "
+              f"{len(latencies) / elapsed:7.1f} req/s  p50 {percentile(latencies, 50) * 1000:7.1f} ms  "
+              f"p99 {percentile(latencies, 99) * 1000:7.1f} ms  status {statuses}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# Cost of rate limiter decisions: MemoryTokenBuckets.take alone, and a whole request through
+# RateLimitMiddleware in front of a no-op ASGI app compared with the bare app. With --redis-url
+# the same for RedisTokenBuckets, plus concurrent requests to show the awaited round trips overlap
+#   python -m benchmarks.bench_ratelimit --calls 200000
+#   python -m benchmarks.bench_ratelimit --redis-url redis://localhost:6379/0   # shared store too
+import argparse
+import asyncio
+import time
+
+# common must be imported before app, it provides the DB_* settings database.py needs
+from .common import asgi_request
+from app import ratelimit
+
+
+async def noop_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+# microseconds per call of fn(i)
+def per_call(fn, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        fn(i)
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+# microseconds per request through app, concurrency requests at a time
+async def per_request(app, method, path, params, calls, concurrency=1):
+    async def client(n):
+        for _ in range(n):
+            await asgi_request(app, method, path, params)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client(calls // concurrency) for _ in range(concurrency)])
+    return (time.perf_counter() - start) / (calls // concurrency * concurrency) * 1e6
+
+
+# microseconds per awaited call of fn(i)
+async def per_await(fn, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        await fn(i)
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--users", type=int, default=10000, help="Distinct bucket keys")
+    parser.add_argument("--redis-url", help="Also time RedisTokenBuckets against this server")
+    args = parser.parse_args()
+
+    buckets = ratelimit.MemoryTokenBuckets()
+    keys = [f"my_grades:u{i}" for i in range(args.users)]
+    allowed = per_call(lambda i: buckets.take(keys[i % len(keys)], 1e9, 10), args.calls)
+    rejected = per_call(lambda i: buckets.take("hot", 1e-9, 1), args.calls)
+    print(f"memory take   allowed {allowed:6.2f} us  rejected {rejected:6.2f} us  ({len(buckets)} buckets)")
+
+    rules = [ratelimit.Rule("my_grades", "GET", "/api/grades/my-grades", "user", 1e9, 10, 1000),
+             ratelimit.Rule("grade_write", "PUT", "/api/grades/student/{student_id}/subject/{subject_id}",
+                            "user", 1e9, 10, 0)]
+    limited = ratelimit.RateLimitMiddleware(noop_app, rules, ratelimit.MemoryTokenBuckets())
+    calls = min(args.calls, 50000)
+    params = {"user_id": 42}
+
+    async def run():
+        bare = await per_request(noop_app, "GET", "/api/grades/my-grades", params, calls)
+        exact = await per_request(limited, "GET", "/api/grades/my-grades", params, calls)
+        template = await per_request(limited, "PUT", "/api/grades/student/3/subject/7", params, calls)
+        passthrough = await per_request(limited, "GET", "/api/subjects", params, calls)
+        return bare, exact, template, passthrough
+
+    bare, exact, template, passthrough = asyncio.run(run())
+    print(f"request       bare {bare:6.2f} us")
+    print(f"  + limiter   exact route {exact - bare:+6.2f} us  templated route {template - bare:+6.2f} us  "
+          f"unlimited route {passthrough - bare:+6.2f} us")
+
+    if args.redis_url:
+        import redis.asyncio
+        calls = min(args.calls, 20000)
+
+        async def run_shared():
+            client = redis.asyncio.Redis.from_url(args.redis_url)
+            shared = ratelimit.RedisTokenBuckets(client, prefix="bench:ratelimit:")
+            take = await per_await(lambda i: shared.take(keys[i % len(keys)], 1e9, 10), calls)
+            limited = ratelimit.RateLimitMiddleware(noop_app, rules, shared)
+            serial = await per_request(limited, "GET", "/api/grades/my-grades", params, calls)
+            concurrent = await per_request(limited, "GET", "/api/grades/my-grades", params, calls, 32)
+            await client.aclose()
+            return take, serial, concurrent
+
+        take, serial, concurrent = asyncio.run(run_shared())
+        print(f"redis take    {take:6.2f} us per decision (one round trip)")
+        print(f"  + limiter   exact route {serial - bare:+6.2f} us  "
+              f"32 concurrent {concurrent - bare:+6.2f} us per request (round trips overlap on the loop)")
+
+
+if __name__ == "__main__":
+    main()
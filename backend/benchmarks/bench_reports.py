@@ -0,0 +1,87 @@
+# Whole-school report card export: one crud.get_student_grades call per student (the old way)
+# against app.reports' chunked export, rendered inline and in the process pool, with a cold
+# cache, a warm one, and after 1% of the students had a grade changed
+#   python -m benchmarks.bench_reports --students 5000 --subjects 12 --format pdf --workers 4
+import argparse
+import time
+
+# common must be imported before app, it provides the DB_* settings database.py needs
+from .common import make_sessionmaker, seed
+from sqlalchemy import event
+from app import crud, reports, schemas
+
+
+def per_student(db, fmt):
+    render = reports.RENDERERS[fmt]
+    for student in crud.get_all_students(db):
+        grades = crud.get_student_grades(db, student.user_id)
+        render(reports.CardData(student.user_id, student.username, student.full_name,
+                                [(g['subject_name'], g['grade_value']) for g in grades]))
+
+
+def export(db, fmt):
+    for _ in reports.iter_export(db, fmt):
+        pass
+
+
+# (seconds, SQL statements) of fn(db, fmt)
+def measure(Session, fn, fmt):
+    db = Session()
+    statements = []
+    count = lambda *args: statements.append(1)
+    event.listen(db.get_bind(), "before_cursor_execute", count)
+    start = time.perf_counter()
+    fn(db, fmt)
+    elapsed = time.perf_counter() - start
+    event.remove(db.get_bind(), "before_cursor_execute", count)
+    db.close()
+    return elapsed, len(statements)
+
+
+def report(label, result, students):
+    elapsed, statements = result
+    print(f"{label:>22}: {elapsed * 1000:9.1f} ms  {elapsed / students * 1e6:8.1f} us/card  {statements:6d} queries")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--subjects", type=int, default=12)
+    parser.add_argument("--format", choices=sorted(reports.FORMATS), default="pdf")
+    parser.add_argument("--workers", type=int, default=max(2, reports.REPORT_WORKERS), help="Render processes")
+    args = parser.parse_args()
+
+    Session = make_sessionmaker()
+    db = Session()
+    student_ids, subject_ids = seed(db, args.students, args.subjects)
+    crud.bulk_upsert_grades(db, [
+        schemas.GradeBulkItem(student_id=st, subject_id=su, grade_value="ABCDE"[(st + su) % 5])
+        for st in student_ids for su in subject_ids
+    ])
+    db.close()
+    n, fmt = args.students, args.format
+
+    report("per student", measure(Session, per_student, fmt), n)
+    workers = reports.REPORT_WORKERS
+    reports.REPORT_WORKERS = 0
+    report("export inline, cold", measure(Session, export, fmt), n)
+    reports.REPORT_WORKERS = args.workers
+    reports.report_cards.clear()
+    # start every worker outside the timing
+    list(reports._get_pool().map(time.sleep, [0.2] * args.workers))
+    report(f"export {args.workers} procs, cold", measure(Session, export, fmt), n)
+    reports.REPORT_WORKERS = workers
+    report("export, warm", measure(Session, export, fmt), n)
+
+    db = Session()
+    crud.bulk_upsert_grades(db, [
+        schemas.GradeBulkItem(student_id=st, subject_id=subject_ids[0], grade_value="F")
+        for st in student_ids[::100]
+    ])
+    db.close()
+    report("export, 1% changed", measure(Session, export, fmt), n)
+    reports.shutdown()
+
+
+if __name__ == "__main__":
+    main()
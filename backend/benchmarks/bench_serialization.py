@@ -0,0 +1,93 @@
+# CPU time and peak memory per response for the student listing and a grade sheet, built
+# the old way (ORM objects validated through the response models, then jsonable_encoder and
+# json.dumps) and the lean way (column-only rows encoded by app.serialization)
+#   python -m benchmarks.bench_serialization --students 1000 --subjects 40
+import argparse
+import gzip
+import time
+import tracemalloc
+from typing import List
+
+# common must be imported before app, it provides the DB_* settings database.py needs
+from .common import make_sessionmaker, seed
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from app import crud, models, schemas
+from app.serialization import FastJSONResponse, orjson, row_dict, row_dicts
+
+users_adapter = TypeAdapter(List[schemas.UserResponse])
+grades_adapter = TypeAdapter(schemas.StudentGradesResponse)
+
+
+def students_before(db, limit):
+    students = db.query(models.User).filter(models.User.role == "student").order_by(models.User.user_id).limit(limit).all()
+    return JSONResponse(jsonable_encoder(users_adapter.validate_python(students, from_attributes=True))).body
+
+
+def students_after(db, limit):
+    rows, _ = crud.list_users(db, "student", None, 0, limit)
+    return FastJSONResponse(row_dicts(rows)).body
+
+
+def sheet_before(db, student_id):
+    student = db.query(models.User).filter(models.User.user_id == student_id).first()
+    grades = db.query(models.Grade).filter(models.Grade.student_id == student_id).all()
+    sheet = {"student": student, "grades": crud._merge_student_grades(crud.get_all_subjects(db), grades)}
+    return JSONResponse(jsonable_encoder(grades_adapter.validate_python(sheet, from_attributes=True))).body
+
+
+def sheet_after(db, student_id):
+    student = crud.get_student_by_id(db, student_id)
+    grades = crud.get_student_grades(db, student_id, crud.get_student_grade_rows(db, student_id))
+    return FastJSONResponse({"student": row_dict(student), "grades": grades}).body
+
+
+# (cpu ms per response, peak KiB per response, body bytes, gzipped bytes)
+def measure(db, fn, arg, repeat):
+    body = fn(db, arg)
+    db.expunge_all()
+    start = time.process_time()
+    for _ in range(repeat):
+        fn(db, arg)
+        db.expunge_all()
+    cpu = (time.process_time() - start) / repeat
+    tracemalloc.start()
+    fn(db, arg)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    db.expunge_all()
+    return cpu * 1000, peak / 1024, len(body), len(gzip.compress(body))
+
+
+def report(label, before, after):
+    for name, (cpu, peak, size, packed) in (("before", before), ("after", after)):
+        print(f"{label:>9} {name:>6}: {cpu:8.2f} ms cpu  {peak:9.1f} KiB peak  "
+              f"{size:8d} B json  {packed:7d} B gzip")
+    print(f"{label:>9}  ratio: {before[0] / after[0]:5.1f}x cpu  {before[1] / after[1]:5.1f}x memory")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--subjects", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    Session = make_sessionmaker()
+    db = Session()
+    student_ids, subject_ids = seed(db, args.students, args.subjects)
+    crud.bulk_upsert_grades(db, [
+        schemas.GradeBulkItem(student_id=st, subject_id=su, grade_value="ABCDE"[(st + su) % 5])
+        for st in student_ids[:10] for su in subject_ids
+    ])
+    print(f"encoder: {'orjson' if orjson is not None else 'json'}")
+    report("students", measure(db, students_before, args.students, args.repeat),
+           measure(db, students_after, args.students, args.repeat))
+    report("sheet", measure(db, sheet_before, student_ids[0], args.repeat * 10),
+           measure(db, sheet_after, student_ids[0], args.repeat * 10))
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
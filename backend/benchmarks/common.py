@@ -0,0 +1,109 @@
+# Shared helpers for the backend benchmarks, run from backend/ with: python -m benchmarks.<name>
+import asyncio
+import json
+import os
+import tempfile
+import time
+from urllib.parse import urlencode
+
+# database.py reads these at import time, benchmarks use their own SQLite engine
+for key, value in {"DB_USER": "bench", "DB_PASSWORD": "bench", "DB_HOST": "localhost",
+                   "DB_PORT": "3306", "DB_NAME": "bench"}.items():
+    os.environ.setdefault(key, value)
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.database import Base, _enable_sqlite_foreign_keys
+
+
+# create the tables in a database (a fresh SQLite file by default) and return a session
+# factory bound to it
+def make_sessionmaker(path=None, url=None):
+    if url is None:
+        if path is None:
+            path = os.path.join(tempfile.mkdtemp(prefix="grade_bench_"), "bench.db")
+        url = f"sqlite:///{path}"
+    if url.startswith("sqlite"):
+        engine = create_engine(url, connect_args={"check_same_thread": False})
+        event.listen(engine, "connect", _enable_sqlite_foreign_keys)
+    else:
+        engine = create_engine(url, pool_size=20, max_overflow=20)
+    Base.metadata.create_all(engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+# seed students and subjects, returns (student_ids, subject_ids)
+def seed(db, students, subjects):
+    db.add_all([
+        models.User(username=f"student{i}", password="student123", full_name=f"Student {i}",
+                    email=f"student{i}@school.com", role="student")
+        for i in range(students)
+    ])
+    db.add_all([models.Subject(subject_name=f"Subject {i}") for i in range(subjects)])
+    db.commit()
+    student_ids = [row.user_id for row in db.query(models.User.user_id).filter(models.User.role == "student")]
+    subject_ids = [row.subject_id for row in db.query(models.Subject.subject_id)]
+    return student_ids, subject_ids
+
+
+# run fn once and return elapsed seconds
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+# route the app's get_db dependency to sessions from Session
+def use_sessionmaker(app, Session):
+    from app.database import get_db
+
+    def _get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = _get_db
+
+
+# call the ASGI app in-process without a server or HTTP client, returns (status, headers, body)
+async def asgi_request(app, method, path, params=None, body=None, headers=None):
+    payload = json.dumps(body).encode() if body is not None else b""
+    raw_headers = [(b"content-type", b"application/json")]
+    raw_headers += [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": urlencode(params or {}).encode(), "headers": raw_headers,
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80), "root_path": "",
+    }
+    sent = False
+    response = {"status": None, "headers": [], "body": bytearray()}
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = message.get("headers", [])
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+    return response["status"], response["headers"], bytes(response["body"])
+
+
+# value at percentile p (0-100) of an already sorted list
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
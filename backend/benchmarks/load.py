@@ -0,0 +1,197 @@
+# Scripted load scenarios against the API, driven in-process over ASGI on a seeded database.
+# Every scenario runs --runs times; the report holds the median of each metric over the runs
+# (throughput, p50/p95/p99 latency, SQL queries per request) and the share of non-2xx
+# responses. It can be saved as a baseline, and a later run fails when a median regresses
+# past the threshold or more requests fail than in the baseline.
+# benchmarks/baseline.json was recorded with the default options and PASSWORD_HASH_ITERATIONS=1000:
+#   PASSWORD_HASH_ITERATIONS=1000 python -m benchmarks.load --baseline benchmarks/baseline.json
+#   PASSWORD_HASH_ITERATIONS=1000 python -m benchmarks.load --save-baseline benchmarks/baseline.json
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+
+# common must be imported before app, it provides the DB_* settings database.py needs
+from .common import asgi_request, make_sessionmaker, percentile, use_sessionmaker
+from .seed import GRADES, seed_database
+from sqlalchemy import event
+from app import models, security
+from app.main import app
+
+
+# each scenario returns (method, path, params, body) for request number i
+def login_storm(ids, rng, i):
+    student = rng.choice(ids["students"])
+    return "POST", "/api/auth/login", None, {"username": _usernames[student], "password": "student123"}
+
+
+def student_dashboard(ids, rng, i):
+    return "GET", "/api/grades/my-grades", {"user_id": rng.choice(ids["students"])}, None
+
+
+def teacher_roster_edit(ids, rng, i):
+    teacher = rng.choice(ids["teachers"])
+    step = i % 3
+    if step == 0:
+        return "GET", "/api/students", {"user_id": teacher, "limit": 100, "after": rng.choice(ids["students"])}, None
+    student = rng.choice(ids["students"])
+    if step == 1:
+        return "GET", f"/api/grades/student/{student}", {"user_id": teacher}, None
+    sheet = [
+        {"student_id": student, "subject_id": s, "grade_value": rng.choice(GRADES)}
+        for s in ids["subjects"]
+    ]
+    return "PUT", "/api/grades/bulk", {"user_id": teacher}, {"grades": sheet}
+
+
+def admin_listing(ids, rng, i):
+    admin = ids["admin"][0]
+    if i % 2:
+        return "GET", "/api/stats", {"user_id": admin}, None
+    return "GET", "/api/users", {"user_id": admin, "limit": 100, "after": rng.choice(ids["students"])}, None
+
+
+# user_id -> username, filled after seeding
+_usernames = {}
+
+SCENARIOS = {
+    "login": login_storm,
+    "student_dashboard": student_dashboard,
+    "teacher_roster_edit": teacher_roster_edit,
+    "admin_listing": admin_listing,
+}
+
+
+async def run_scenario(build, ids, requests, concurrency, seed):
+    rng = random.Random(seed)
+    work = [build(ids, rng, i) for i in range(requests)]
+    latencies = []
+    errors = 0
+    next_index = 0
+
+    async def client():
+        nonlocal next_index, errors
+        while next_index < len(work):
+            method, path, params, body = work[next_index]
+            next_index += 1
+            start = time.perf_counter()
+            status, _, _ = await asgi_request(app, method, path, params=params, body=body)
+            latencies.append(time.perf_counter() - start)
+            if not 200 <= status < 300:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - start, sorted(latencies), errors
+
+
+# metrics of one run of a scenario
+def run_metrics(elapsed, latencies, errors, queries):
+    return {
+        "throughput": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "queries_per_request": round(queries / len(latencies), 2),
+        "error_rate": round(errors / len(latencies), 4),
+    }
+
+
+# median of every metric over the runs, the worst error rate of any run
+def summarize(runs):
+    summary = {key: round(statistics.median(run[key] for run in runs), 2) for key in runs[0]}
+    summary["error_rate"] = max(run["error_rate"] for run in runs)
+    return summary
+
+
+# compare results with a saved baseline, returns the list of regressions
+def regressions(results, baseline, threshold):
+    found = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            found.append(f"{name}: not in the baseline")
+            continue
+        if result["error_rate"] > base["error_rate"]:
+            found.append(f"{name}: {result['error_rate']:.2%} of requests failed > baseline {base['error_rate']:.2%}")
+        if result["throughput"] < base["throughput"] * (1 - threshold):
+            found.append(f"{name}: throughput {result['throughput']} < baseline {base['throughput']}")
+        if result["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            found.append(f"{name}: median p95 {result['p95_ms']} ms > baseline {base['p95_ms']} ms")
+        if result["queries_per_request"] > base["queries_per_request"] * (1 + threshold):
+            found.append(f"{name}: {result['queries_per_request']} queries/request > "
+                         f"baseline {base['queries_per_request']}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="Database URL, a temporary SQLite file by default")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--subjects", type=int, default=12)
+    parser.add_argument("--requests", type=int, default=300, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Run only these scenarios (repeatable)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--runs", type=int, default=5, help="Runs per scenario, medians are reported")
+    parser.add_argument("--warmup", type=int, default=1, help="Unreported runs per scenario before those")
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--baseline", metavar="PATH", help="Fail on regressions against this baseline")
+    parser.add_argument("--threshold", type=float, default=0.3, help="Allowed relative regression of a median")
+    args = parser.parse_args()
+
+    Session = make_sessionmaker(url=args.url)
+    db = Session()
+    ids = seed_database(db, args.users, args.subjects, seed=args.seed)
+    _usernames.update(db.query(models.User.user_id, models.User.username).all())
+    db.close()
+    use_sessionmaker(app, Session)
+
+    queries = [0]
+    event.listen(Session.kw["bind"], "before_cursor_execute",
+                 lambda *a: queries.__setitem__(0, queries[0] + 1))
+
+    # what the numbers depend on besides the code, saved with the baseline
+    settings = {
+        "users": args.users, "subjects": args.subjects, "requests": args.requests,
+        "concurrency": args.concurrency, "seed": args.seed,
+        "runs": args.runs, "warmup": args.warmup, "password_hash_iterations": security.HASH_ITERATIONS,
+    }
+    results = {}
+    print(f"medians of {args.runs} runs")
+    print(f"{'scenario':<20} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'q/req':>6} {'errors':>7}")
+    for name in args.scenario or SCENARIOS:
+        runs = []
+        for run in range(args.warmup + args.runs):
+            before = queries[0]
+            elapsed, latencies, errors = asyncio.run(
+                run_scenario(SCENARIOS[name], ids, args.requests, args.concurrency, args.seed + run)
+            )
+            runs.append(run_metrics(elapsed, latencies, errors, queries[0] - before))
+        results[name] = r = summarize(runs[args.warmup:])
+        print(f"{name:<20} {r['throughput']:>8} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8} "
+              f"{r['queries_per_request']:>6} {r['error_rate']:>7.2%}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"settings": settings, "scenarios": results}, f, indent=2)
+            f.write("\n")
+        print(f"baseline saved to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["settings"] != settings:
+            print(f"warning: baseline was recorded with {baseline['settings']}, this run used {settings}")
+        found = regressions(results, baseline["scenarios"], args.threshold)
+        for line in found:
+            print("REGRESSION", line)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# Seed a benchmark database with the sample accounts from database/schema.sql plus
+# generated users, subjects and a full users x subjects grade matrix
+#   python -m benchmarks.seed --url sqlite:///bench.db --users 1000 --subjects 12
+#   python -m benchmarks.seed --url mysql+pymysql://root:pw@localhost:3306/grade_bench --users 20000
+import argparse
+import random
+
+# common must be imported before app, it provides the DB_* settings database.py needs
+from .common import make_sessionmaker
+from app import models, security, stats
+
+# sample accounts from database/schema.sql, always user_id 1-4
+SAMPLE_USERS = [
+    ("admin", "admin123", "Admin User", "admin@school.com", "admin"),
+    ("teacher1", "teacher123", "John Teacher", "teacher@school.com", "teacher"),
+    ("student1", "student123", "Alice Student", "alice@school.com", "student"),
+    ("student2", "student123", "Bob Student", "bob@school.com", "student"),
+]
+SAMPLE_SUBJECTS = ["Mathematics", "Physics", "Chemistry", "Biology"]
+GRADES = ["A", "B", "C", "D", "E", "F"]
+# one teacher per this many generated users
+TEACHER_RATIO = 50
+CHUNK = 2000
+
+
+def _insert_chunked(db, table, rows):
+    for start in range(0, len(rows), CHUNK):
+        db.execute(table.insert(), rows[start:start + CHUNK])
+
+
+# seed the database, returns {"admin", "teachers", "students", "subjects"} id lists
+def seed_database(db, users: int, subjects: int, fill: float = 1.0, seed: int = 0):
+    rng = random.Random(seed)
+    # every account shares one hash per password, hashing each user separately would dominate seeding
+    hashes = {password: security.hash_password(password) for _, password, *_ in SAMPLE_USERS}
+
+    rows = [
+        {"username": u, "password": hashes[p], "full_name": n, "email": e, "role": r}
+        for u, p, n, e, r in SAMPLE_USERS
+    ]
+    for i in range(max(users - len(SAMPLE_USERS), 0)):
+        teacher = i % TEACHER_RATIO == 0
+        role = "teacher" if teacher else "student"
+        rows.append({
+            "username": f"{role}_{i}",
+            "password": hashes["teacher123" if teacher else "student123"],
+            "full_name": f"{'Teacher' if teacher else 'Student'} {i:06d}",
+            "email": f"{role}_{i}@school.com",
+            "role": role,
+        })
+    _insert_chunked(db, models.User.__table__, rows)
+
+    names = SAMPLE_SUBJECTS + [f"Subject {i}" for i in range(max(subjects - len(SAMPLE_SUBJECTS), 0))]
+    _insert_chunked(db, models.Subject.__table__, [{"subject_name": n} for n in names[:subjects]])
+    db.commit()
+
+    ids = {"admin": [], "teachers": [], "students": []}
+    for user_id, role in db.query(models.User.user_id, models.User.role):
+        ids["admin" if role == "admin" else role + "s"].append(user_id)
+    ids["subjects"] = [s for (s,) in db.query(models.Subject.subject_id)]
+
+    grades = [
+        {"student_id": st, "subject_id": su, "grade_value": rng.choice(GRADES)}
+        for st in ids["students"] for su in ids["subjects"] if rng.random() < fill
+    ]
+    _insert_chunked(db, models.Grade.__table__, grades)
+    db.commit()
+    stats.rebuild(db)
+    return ids
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="Database URL, a temporary SQLite file by default")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--subjects", type=int, default=12)
+    parser.add_argument("--fill", type=float, default=1.0, help="Fraction of the grade matrix to fill")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    Session = make_sessionmaker(url=args.url)
+    db = Session()
+    ids = seed_database(db, args.users, args.subjects, args.fill, args.seed)
+    grades = db.query(models.Grade).count()
+    db.close()
+    print(f"seeded {Session.kw['bind'].url}: {len(ids['students'])} students, "
+          f"{len(ids['teachers'])} teachers, {len(ids['subjects'])} subjects, {grades} grades")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# Tests run offline against a temporary SQLite file, through both the sync engine
+# (DATABASE_URL) and the async engine (ASYNC_DATABASE_URL, aiosqlite):
+#   pip install -r requirements-test.txt
+#   python -m pytest
+import asyncio
+import os
+import tempfile
+
+# database.py reads these at import time
+_db_path = os.path.join(tempfile.mkdtemp(prefix="grade_tests_"), "test.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_path}"
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{_db_path}"
+os.environ.setdefault("PASSWORD_HASH_ITERATIONS", "1000")
+
+import pytest
+
+from app import crud, crud_async, database, models, security, stats
+from app.auth import principal_cache
+from app.database import Base
+
+
+# fresh tables with the schema.sql sample accounts, subjects and one grade for every test
+@pytest.fixture(autouse=True)
+def sample_data():
+    engine = database.get_engine()
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    db = database.new_session()
+    db.add_all([
+        models.User(username="admin", password=security.hash_password("admin123"), full_name="Admin User",
+                    email="admin@school.com", role="admin"),
+        models.User(username="teacher1", password=security.hash_password("teacher123"), full_name="John Teacher",
+                    email="teacher@school.com", role="teacher"),
+        models.User(username="student1", password=security.hash_password("student123"), full_name="Alice Student",
+                    email="alice@school.com", role="student"),
+        models.User(username="student2", password="student123", full_name="Bob Student",
+                    email="bob@school.com", role="student"),
+    ])
+    db.add_all([models.Subject(subject_name=name) for name in ("Mathematics", "Physics", "Chemistry")])
+    db.commit()
+    db.add(models.Grade(student_id=3, subject_id=1, grade_value="A"))
+    db.commit()
+    stats.rebuild(db)
+    db.close()
+    # caches outlive the tables
+    crud.subject_catalog.bump()
+    principal_cache.clear()
+    yield
+    engine.dispose()
+
+
+# call crud.<name> (mode "sync") or crud_async.<name> (mode "async") with a session
+# from the matching get_db dependency, returns its result
+def call(mode: str, name: str, *args):
+    if mode == "sync":
+        dependency = database.get_db()
+        db = next(dependency)
+        try:
+            return getattr(crud, name)(db, *args)
+        finally:
+            dependency.close()
+
+    async def run():
+        dependency = database.get_async_db()
+        db = await dependency.__anext__()
+        try:
+            return await getattr(crud_async, name)(db, *args)
+        finally:
+            await dependency.aclose()
+            # aiosqlite connections are tied to this event loop
+            await database.async_engine.dispose()
+
+    return asyncio.run(run())
+
+
+@pytest.fixture(params=["sync", "async"])
+def mode(request):
+    return request.param
+
+
+# call(mode, ...) for the mode of the test
+@pytest.fixture
+def crud_call(mode):
+    return lambda name, *args: call(mode, name, *args)
@@ -0,0 +1,119 @@
+# The sync (crud) and async (crud_async) database layers share one interface: every test
+# runs once per mode and checks the result through the other engine where it matters.
+import asyncio
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import crud, database, health, models, security, stats
+from app.schemas import GradeBulkItem
+
+
+def test_get_db_yields_sync_session():
+    dependency = database.get_db()
+    db = next(dependency)
+    assert isinstance(db, Session)
+    assert db.scalar(select(models.User.username).where(models.User.user_id == 1)) == "admin"
+    dependency.close()
+
+
+def test_get_async_db_yields_async_session():
+    async def run():
+        dependency = database.get_async_db()
+        db = await dependency.__anext__()
+        try:
+            assert isinstance(db, AsyncSession)
+            assert db.get_bind().dialect.driver == "aiosqlite"
+            return await db.scalar(select(models.User.username).where(models.User.user_id == 1))
+        finally:
+            await dependency.aclose()
+            await database.async_engine.dispose()
+
+    assert asyncio.run(run()) == "admin"
+
+
+def test_login_lookup_and_rehash(crud_call):
+    user = crud_call("get_user_by_login", "student1")
+    assert (user.user_id, user.role) == (3, "student")
+    assert security.verify_password("student123", user.password)
+    assert crud_call("get_user_by_login", "alice@school.com").user_id == 3
+    assert crud_call("get_user_by_login", "nobody") is None
+
+    # legacy plaintext password upgraded on login
+    legacy = crud_call("get_user_by_login", "student2")
+    assert security.needs_rehash(legacy.password)
+    crud_call("set_user_password", legacy.user_id, security.hash_password("student123"))
+    upgraded = crud_call("get_user_by_login", "bob@school.com")
+    assert security.is_hashed(upgraded.password)
+    assert security.verify_password("student123", upgraded.password)
+
+
+def test_update_grade(crud_call):
+    grade = crud_call("update_grade", 3, 1, "B")
+    assert (grade.student_id, grade.subject_id, grade.grade_value) == (3, 1, "B")
+    crud_call("update_grade", 3, 2, "C")
+
+    grades = {g["subject_id"]: g["grade_value"] for g in crud_call("get_student_grades", 3)}
+    assert grades == {1: "B", 2: "C", 3: None}
+
+    db = database.new_session()
+    try:
+        changes = [(c.student_id, c.subject_id, c.grade_value) for c in crud.get_grade_changes(db, 0)]
+        assert changes == [(3, 1, "B"), (3, 2, "C")]
+        assert stats.student_stats(db, 3)["gpa"] == 2.5
+    finally:
+        db.close()
+
+
+def test_bulk_upsert_grades(crud_call):
+    results = crud_call("bulk_upsert_grades", [
+        GradeBulkItem(student_id=3, subject_id=1, grade_value="D"),
+        GradeBulkItem(student_id=4, subject_id=2, grade_value="A"),
+        GradeBulkItem(student_id=4, subject_id=3, grade_value="B"),
+        GradeBulkItem(student_id=1, subject_id=1, grade_value="A"),
+        GradeBulkItem(student_id=4, subject_id=99, grade_value="A"),
+    ])
+    assert [(r["status"], r["detail"]) for r in results] == [
+        ("ok", None), ("ok", None), ("ok", None),
+        ("error", "Student not found"), ("error", "Subject not found"),
+    ]
+
+    db = database.new_session()
+    try:
+        rows = db.execute(
+            select(models.Grade.student_id, models.Grade.subject_id, models.Grade.grade_value)
+            .order_by(models.Grade.student_id, models.Grade.subject_id)
+        ).all()
+        assert [tuple(r) for r in rows] == [(3, 1, "D"), (4, 2, "A"), (4, 3, "B")]
+        assert len(crud.get_grade_changes(db, 0)) == 3
+        assert stats.student_stats(db, 4)["gpa"] == 3.5
+    finally:
+        db.close()
+
+
+def test_subject_catalog_shared_between_modes(crud_call):
+    subjects, etag = crud_call("get_subject_catalog")
+    assert [s.subject_name for s in subjects] == ["Mathematics", "Physics", "Chemistry"]
+
+    db = database.new_session()
+    try:
+        crud.create_subject(db, "Biology")
+    finally:
+        db.close()
+    updated, updated_etag = crud_call("get_subject_catalog")
+    assert [s.subject_name for s in updated][-1] == "Biology"
+    assert updated_etag != etag
+    assert crud_call("get_all_subjects") == updated
+
+
+def test_readiness_checks_the_async_engine(monkeypatch):
+    monkeypatch.setattr(database, "DB_ASYNC", True)
+
+    async def run():
+        try:
+            return await health.readiness_checks()
+        finally:
+            await database.async_engine.dispose()
+
+    assert asyncio.run(run()) == {"database": None, "async_database": None, "cache": None}
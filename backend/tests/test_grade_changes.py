@@ -0,0 +1,63 @@
+# Grade change log entries get their change_id from grade_change_sequence when the
+# transaction commits, so cursors handed to clients never pass an uncommitted change.
+from sqlalchemy import func, select
+
+from app import crud, database, models
+from app.schemas import GradeBulkItem
+
+
+def _change_ids(db):
+    return list(db.scalars(select(models.GradeChange.change_id).order_by(models.GradeChange.change_id)))
+
+
+def _last_change_id(db):
+    return db.scalar(select(models.GradeChangeSequence.last_change_id).where(models.GradeChangeSequence.id == 1))
+
+
+def test_change_ids_follow_the_sequence(crud_call):
+    crud_call("bulk_upsert_grades", [
+        GradeBulkItem(student_id=4, subject_id=subject_id, grade_value="B") for subject_id in (1, 2, 3)
+    ])
+    crud_call("update_grade", 3, 1, "C")
+    # unchanged values are not logged
+    crud_call("update_grade", 3, 1, "C")
+
+    db = database.new_session()
+    try:
+        assert _change_ids(db) == [1, 2, 3, 4]
+        assert _last_change_id(db) == 4
+        assert [c.grade_value for c in crud.get_grade_changes(db, 3)] == ["C"]
+    finally:
+        db.close()
+
+
+def test_entries_are_written_at_commit():
+    db = database.new_session()
+    try:
+        crud._record_grade_changes(db, [(4, 1, None, "A"), (4, 2, None, "B")])
+        assert db.scalar(select(func.count()).select_from(models.GradeChange)) == 0
+        crud._commit_grade_changes(db)
+        assert _change_ids(db) == [1, 2]
+
+        crud._record_grade_changes(db, [(4, 3, None, "C")])
+        crud._rollback_grade_changes(db)
+        crud._commit_grade_changes(db)
+        assert _change_ids(db) == [1, 2]
+    finally:
+        db.close()
+
+
+def test_sequence_continues_after_existing_entries():
+    engine = database.get_engine()
+    db = database.new_session()
+    try:
+        # a log written before grade_change_sequence existed
+        db.add_all([models.GradeChange(change_id=i, student_id=3, subject_id=1, grade_value="A") for i in (1, 2, 7)])
+        db.commit()
+        models.GradeChangeSequence.__table__.drop(engine)
+        database.Base.metadata.create_all(engine)
+        crud.update_grade(db, 3, 2, "B")
+        assert _change_ids(db) == [1, 2, 7, 8]
+        assert _last_change_id(db) == 8
+    finally:
+        db.close()
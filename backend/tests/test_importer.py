@@ -0,0 +1,56 @@
+# CSV user import: passwords hashed at full strength (in the hashing pool for larger chunks),
+# and a chunk whose executemany loses a race for an email or username retried row by row.
+import io
+
+from sqlalchemy import select
+
+from app import database, importer, models, security
+
+HEADER = "full_name,email,role,username,password\n"
+
+
+def _user_csv(*users):
+    return io.StringIO(HEADER + "".join(f"{u},{u}@school.com,student,{u},secret-{u}\n" for u in users))
+
+
+def _stored(db, username):
+    return db.scalar(select(models.User.password).where(models.User.username == username))
+
+
+def test_imported_passwords_use_the_login_iterations(monkeypatch):
+    monkeypatch.setattr(importer, "IMPORT_HASH_WORKERS", 2)
+    db = database.new_session()
+    try:
+        report = importer.import_csv(db, "users", _user_csv("carol", "dave", "erin"))
+        assert (report["imported"], report["failed"]) == (3, 0)
+        for name in ("carol", "dave", "erin"):
+            stored = _stored(db, name)
+            assert int(stored.split("$")[1]) == security.HASH_ITERATIONS
+            assert security.verify_password(f"secret-{name}", stored)
+            assert not security.needs_rehash(stored)
+    finally:
+        db.close()
+        importer.shutdown()
+
+
+def test_chunk_retried_row_by_row_after_a_concurrent_insert(monkeypatch):
+    monkeypatch.setattr(importer, "IMPORT_HASH_WORKERS", 0)
+    # the lookup misses users created after it ran, as with a concurrent signup
+    monkeypatch.setattr(importer, "_taken", lambda db, users: set())
+    db = database.new_session()
+    try:
+        csv = io.StringIO(HEADER + "".join([
+            "Carol,carol@school.com,student,carol,pw\n",
+            "Alice Again,alice@school.com,student,alice2,pw\n",
+            "Other Student,other@school.com,student,student1,pw\n",
+            "Dave,dave@school.com,student,dave,pw\n",
+        ]))
+        report = importer.import_csv(db, "users", csv)
+        assert (report["imported"], report["failed"]) == (2, 2)
+        assert report["errors"] == [
+            {"line": 3, "error": "User already exists"},
+            {"line": 4, "error": "Username already taken"},
+        ]
+        assert _stored(db, "carol") and _stored(db, "dave")
+    finally:
+        db.close()
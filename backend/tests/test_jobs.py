@@ -0,0 +1,78 @@
+# Jobs left running by a stopped worker are queued again once their heartbeat is older
+# than JOB_LEASE_SECONDS, on startup (resume_queued) and when the same deletion is requested.
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from app import database, jobs, models
+
+
+def _running_job(db, kind, target_id, heartbeat_age):
+    beat = datetime.utcnow() - timedelta(seconds=heartbeat_age)
+    job = models.Job(kind=kind, target_id=target_id, status="running", started_at=beat, heartbeat_at=beat)
+    db.add(job)
+    db.commit()
+    return job.job_id
+
+
+# final status of job_id once the job pool is done with it
+def _wait(job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        db = database.new_session()
+        try:
+            status = db.get(models.Job, job_id).status
+        finally:
+            db.close()
+        if status in ("done", "failed") or time.monotonic() > deadline:
+            return status
+        time.sleep(0.05)
+
+
+def test_resume_reclaims_stale_running_jobs():
+    db = database.new_session()
+    try:
+        stale = _running_job(db, jobs.DELETE_SUBJECT, 1, jobs.JOB_LEASE_SECONDS + 60)
+        live = _running_job(db, jobs.DELETE_SUBJECT, 2, 1)
+    finally:
+        db.close()
+
+    jobs.resume_queued(database.get_engine())
+
+    assert _wait(stale) == "done"
+    db = database.new_session()
+    try:
+        assert db.get(models.Job, live).status == "running"
+        assert db.get(models.Subject, 1) is None
+        assert db.scalars(select(models.Grade).where(models.Grade.subject_id == 1)).all() == []
+    finally:
+        db.close()
+
+
+def test_enqueue_resubmits_a_stale_running_job():
+    db = database.new_session()
+    try:
+        stale = _running_job(db, jobs.DELETE_USER, 3, jobs.JOB_LEASE_SECONDS + 60)
+        job = jobs.enqueue(db, jobs.DELETE_USER, 3)
+        assert job.job_id == stale
+    finally:
+        db.close()
+
+    assert _wait(stale) == "done"
+    db = database.new_session()
+    try:
+        assert db.get(models.User, 3) is None
+    finally:
+        db.close()
+
+
+def test_enqueue_returns_a_live_running_job():
+    db = database.new_session()
+    try:
+        live = _running_job(db, jobs.DELETE_USER, 3, 1)
+        job = jobs.enqueue(db, jobs.DELETE_USER, 3)
+        assert (job.job_id, job.status) == (live, "running")
+        assert db.get(models.User, 3) is not None
+    finally:
+        db.close()
@@ -0,0 +1,114 @@
+# Query timing hooks of app/metrics.py and app/profiling.py must not leave per-statement
+# state on pooled connections when a statement fails, and the slow request sampler must
+# only record the threads running the request.
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+
+from app import metrics, profiling
+
+
+def _run_failing_then_ok(engine):
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM missing_table"))
+        conn.execute(text("SELECT 1"))
+        return dict(conn.info)
+
+
+def test_metrics_timing_survives_failed_statements():
+    engine = create_engine("sqlite://")
+    metrics.instrument_engine(engine, "test")
+    before = sum(metrics.query_duration._counts)
+    info = _run_failing_then_ok(engine)
+    assert "query_start" not in info
+    assert sum(metrics.query_duration._counts) == before + 1
+    metrics._engines.remove(("test", engine))
+
+
+def test_profiling_timing_survives_failed_statements():
+    engine = create_engine("sqlite://")
+    event.listen(engine, "before_cursor_execute", profiling._before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", profiling._after_cursor_execute)
+    profile = profiling.RequestProfile("GET", "/test")
+    token = profiling._current.set(profile)
+    try:
+        info = _run_failing_then_ok(engine)
+    finally:
+        profiling._current.reset(token)
+    assert "profile_start" not in info
+    assert profile.queries == 1
+    assert profile.db_time > 0
+
+
+def test_sampler_records_only_request_threads(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False})
+    event.listen(engine, "before_cursor_execute", profiling._before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", profiling._after_cursor_execute)
+    sampler = profiling.StackSampler(interval=0.01, slow_after=0)
+    monkeypatch.setattr(profiling, "_sampler", sampler)
+    profile = profiling.RequestProfile("GET", "/slow")
+    sampler.track(profile)
+    queried, release = threading.Event(), threading.Event()
+
+    def handle_request():
+        profiling._current.set(profile)
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        queried.set()
+        release.wait()
+
+    # an idle thread that never runs the request's code
+    bystander = threading.Thread(target=release.wait)
+    worker = threading.Thread(target=handle_request)
+    bystander.start()
+    worker.start()
+    queried.wait()
+    for _ in range(5):
+        sampler.sample()
+    release.set()
+    worker.join()
+    bystander.join()
+    sampler.untrack(profile)
+
+    assert sum(profile.samples.values()) == 5
+    assert all("handle_request" in stack for stack in profile.samples)
+    assert sampler._owners == {}
+
+
+# Server-Timing headers and body chunks a ProfilingMiddleware response is sent with
+def _profiled(chunks):
+    async def app(scope, receive, send):
+        profiling._current.get().queries += 2
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        for i, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    scope = {"type": "http", "method": "GET", "path": "/test", "headers": [], "query_string": b""}
+    asyncio.run(profiling.ProfilingMiddleware(app)(scope, receive, send))
+    timing = [value for name, value in sent[0]["headers"] if name == b"server-timing"]
+    return timing, [m["body"] for m in sent[1:]]
+
+
+def test_server_timing_on_complete_responses():
+    timing, body = _profiled([b"ok"])
+    assert body == [b"ok"]
+    assert len(timing) == 1 and b'desc="2 queries"' in timing[0]
+
+
+def test_no_server_timing_on_streamed_responses():
+    timing, body = _profiled([b"a", b"b", b""])
+    assert body == [b"a", b"b", b""]
+    assert timing == []
@@ -0,0 +1,105 @@
+# RateLimitMiddleware with shared (Redis) buckets awaits each decision on the event loop
+# instead of blocking it. The fake client stands in for redis.asyncio and runs the token
+# bucket of _TAKE_SCRIPT in Python.
+import asyncio
+import time
+
+from app import ratelimit
+
+
+class FakeAsyncRedis:
+    def __init__(self):
+        self.buckets = {}
+        self.pending = 0
+        self.max_pending = 0
+
+    def register_script(self, script):
+        assert script == ratelimit._TAKE_SCRIPT
+        return self._take
+
+    async def _take(self, keys, args):
+        self.pending += 1
+        self.max_pending = max(self.max_pending, self.pending)
+        # the round trip, other requests get the loop meanwhile
+        await asyncio.sleep(0.01)
+        self.pending -= 1
+        rate, burst = float(args[0]), int(args[1])
+        now = time.monotonic()
+        tokens, ts = self.buckets.get(keys[0], (burst, now))
+        tokens = min(burst, tokens + (now - ts) * rate)
+        wait = 0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        self.buckets[keys[0]] = (tokens, now)
+        return str(wait)
+
+
+async def noop_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+# status code of one GET path?user_id=user_id through app
+async def status_of(app, path, user_id):
+    scope = {"type": "http", "method": "GET", "path": path, "client": ("127.0.0.1", 5000),
+             "query_string": f"user_id={user_id}".encode(), "headers": []}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return messages[0]["status"]
+
+
+RULES = [ratelimit.Rule("my_grades", "GET", "/api/grades/my-grades", "user", 0.001, 3, 0)]
+
+
+def test_redis_buckets_are_awaited():
+    client = FakeAsyncRedis()
+    app = ratelimit.RateLimitMiddleware(noop_app, RULES, ratelimit.RedisTokenBuckets(client))
+
+    async def run():
+        return [await status_of(app, "/api/grades/my-grades", 3) for _ in range(4)]
+
+    assert asyncio.run(run()) == [200, 200, 200, 429]
+    assert list(client.buckets) == [ratelimit.cache.CACHE_PREFIX + "ratelimit:my_grades:u3"]
+
+
+def test_redis_round_trips_overlap():
+    client = FakeAsyncRedis()
+    app = ratelimit.RateLimitMiddleware(noop_app, RULES, ratelimit.RedisTokenBuckets(client))
+
+    async def run():
+        return await asyncio.gather(*[status_of(app, "/api/grades/my-grades", user_id) for user_id in range(10)])
+
+    assert asyncio.run(run()) == [200] * 10
+    assert client.max_pending == 10
+
+
+def test_memory_buckets_answer_inline():
+    app = ratelimit.RateLimitMiddleware(noop_app, RULES, ratelimit.MemoryTokenBuckets())
+
+    async def run():
+        return [await status_of(app, "/api/grades/my-grades", 3) for _ in range(4)]
+
+    assert asyncio.run(run()) == [200, 200, 200, 429]
+    assert not app._await_take
+
+
+def test_memory_buckets_stay_within_max_keys():
+    buckets = ratelimit.MemoryTokenBuckets(max_keys=100)
+    buckets.take("hot", 0.001, 2)
+    for i in range(1000):
+        # none of these has refilled yet, they are evicted least recently used first
+        assert buckets.take(f"my_grades:u{i}", 0.001, 2) == 0.0
+        assert len(buckets) <= 100
+        if i % 10 == 0:
+            buckets.take("hot", 0.001, 2)
+    assert "hot" in buckets._buckets
+    assert buckets.take("hot", 0.001, 2) > 0
@@ -0,0 +1,59 @@
+# Cached report cards are stamped with the student's latest grade change_id, so any grade
+# write or deletion re-renders the card, even within the same second or at the same count.
+from datetime import datetime
+
+from sqlalchemy import update
+
+from app import crud, database, models, reports
+
+SECOND = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def _csv_card(db, student_id):
+    return reports.get_card(db, student_id, "csv")[1]
+
+
+# update a grade with a one-second updated_at resolution, as MySQL TIMESTAMP has
+def _update_grade(db, student_id, subject_id, value):
+    crud.update_grade(db, student_id, subject_id, value)
+    db.execute(update(models.Grade).values(updated_at=SECOND))
+    db.commit()
+
+
+def test_card_follows_every_grade_change():
+    reports.report_cards.clear()
+    db = database.new_session()
+    try:
+        _update_grade(db, 3, 2, "B")
+        assert "Physics,B" in _csv_card(db, 3)
+
+        # same grade count and the same updated_at second
+        _update_grade(db, 3, 2, "C")
+        assert "Physics,C" in _csv_card(db, 3)
+        _update_grade(db, 3, 2, "B")
+        assert "Physics,B" in _csv_card(db, 3)
+    finally:
+        db.close()
+
+
+def test_card_follows_a_subject_deletion():
+    reports.report_cards.clear()
+    db = database.new_session()
+    try:
+        crud.update_grade(db, 3, 2, "B")
+        assert "Physics,B" in _csv_card(db, 3)
+        crud.delete_subject(db, 2)
+        assert "Physics" not in _csv_card(db, 3)
+    finally:
+        db.close()
+
+
+def test_unchanged_card_is_served_from_cache(monkeypatch):
+    reports.report_cards.clear()
+    db = database.new_session()
+    try:
+        first = _csv_card(db, 3)
+        monkeypatch.setattr(reports, "render", lambda fmt, cards: 1 / 0)
+        assert _csv_card(db, 3) == first
+    finally:
+        db.close()
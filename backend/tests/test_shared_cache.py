@@ -0,0 +1,146 @@
+# The shared cache backend (CACHE_BACKEND=redis) against an in-process stand-in for the
+# Redis server: FakeRedis and FakeAsyncRedis are the redis-py and redis.asyncio clients,
+# both talking to one FakeServer.
+import asyncio
+import fnmatch
+
+import pytest
+
+from app import auth, cache, crud, crud_async, database
+
+
+class FakeServer:
+    def __init__(self):
+        self.data = {}
+
+
+class FakeRedis:
+    def __init__(self, server):
+        self.server = server
+
+    def get(self, key):
+        return self.server.data.get(key)
+
+    def set(self, key, value, px=None):
+        self.server.data[key] = value.encode() if isinstance(value, str) else value
+
+    def delete(self, key):
+        self.server.data.pop(key, None)
+
+    def incr(self, key):
+        value = int(self.server.data.get(key, 0)) + 1
+        self.server.data[key] = str(value).encode()
+        return value
+
+    def scan_iter(self, match):
+        return [key for key in list(self.server.data) if fnmatch.fnmatch(key, match)]
+
+    def ping(self):
+        return True
+
+
+class FakeAsyncRedis:
+    def __init__(self, server):
+        self.sync = FakeRedis(server)
+
+    async def get(self, key):
+        return self.sync.get(key)
+
+    async def set(self, key, value, px=None):
+        self.sync.set(key, value, px)
+
+
+# a sync client for code that must not use it
+class NoSyncCalls:
+    def __getattr__(self, name):
+        raise AssertionError(f"blocking redis call {name} on the async path")
+
+
+@pytest.fixture
+def server():
+    return FakeServer()
+
+
+# async routes run lookup_principal_async and crud_async.get_subject_catalog with shared
+# caches whose sync client refuses every call
+def test_async_paths_only_await_redis(server, monkeypatch):
+    principals = cache.RedisCache(NoSyncCalls(), "p:", 60, decode=lambda value: auth.Principal(*value),
+                                  async_client=FakeAsyncRedis(server))
+    catalog = cache.VersionedValue(cache.RedisCounter(NoSyncCalls(), "catalog:version",
+                                                      async_client=FakeAsyncRedis(server)))
+    monkeypatch.setattr(auth, "principal_cache", principals)
+    monkeypatch.setattr(crud_async, "subject_catalog", catalog)
+
+    async def run():
+        dependency = database.get_async_db()
+        db = await dependency.__anext__()
+        try:
+            miss = await auth.lookup_principal_async(db, 3)
+            hit = await auth.lookup_principal_async(db, 3)
+            subjects = await crud_async.get_all_subjects(db)
+            return miss, hit, subjects
+        finally:
+            await dependency.aclose()
+            await database.async_engine.dispose()
+
+    miss, hit, subjects = asyncio.run(run())
+    assert miss == hit == auth.Principal(3, "student1", "Alice Student", "alice@school.com", "student")
+    assert list(server.data) == ["p:3"]
+    assert [s.subject_name for s in subjects] == ["Mathematics", "Physics", "Chemistry"]
+
+
+# make_cache / make_counter of a worker on CACHE_BACKEND=redis, each worker with its own
+# client (set through set_redis_client) on the shared server
+@pytest.fixture
+def workers(server, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_BACKEND", "redis")
+    monkeypatch.setattr(cache, "_redis_client", None)
+
+    def worker():
+        cache.set_redis_client(FakeRedis(server))
+        return (
+            cache.make_cache("principal", 16, 60, decode=lambda value: auth.Principal(*value)),
+            cache.VersionedValue(cache.make_counter("subject_catalog")),
+        )
+
+    return worker
+
+
+def test_user_deletion_evicts_principal_in_every_worker(workers, monkeypatch):
+    principals_a, _ = workers()
+    principals_b, _ = workers()
+    db = database.new_session()
+    try:
+        monkeypatch.setattr(auth, "principal_cache", principals_b)
+        assert auth.lookup_principal(db, 3).username == "student1"
+        assert principals_a.get(3) == principals_b.get(3)
+
+        # worker a deletes the user
+        monkeypatch.setattr(auth, "principal_cache", principals_a)
+        assert crud.delete_user(db, 3)
+
+        monkeypatch.setattr(auth, "principal_cache", principals_b)
+        assert principals_b.get(3) is cache.MISSING
+        assert auth.lookup_principal(db, 3) is None
+    finally:
+        db.close()
+
+
+def test_subject_change_bumps_the_shared_catalog_version(workers, monkeypatch):
+    _, catalog_a = workers()
+    _, catalog_b = workers()
+    db = database.new_session()
+    try:
+        names = lambda catalog: [s.subject_name for s in catalog.get(lambda: crud._load_subject_catalog(db))[0]]
+        assert names(catalog_b) == ["Mathematics", "Physics", "Chemistry"]
+        version = catalog_b.version
+
+        # worker a adds a subject, worker b reloads on its next read
+        monkeypatch.setattr(crud, "subject_catalog", catalog_a)
+        crud.create_subject(db, "Biology")
+
+        assert catalog_b.version == version + 1
+        assert catalog_b.peek()[1] is cache.MISSING
+        assert names(catalog_b) == ["Mathematics", "Physics", "Chemistry", "Biology"]
+    finally:
+        db.close()
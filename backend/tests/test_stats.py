@@ -0,0 +1,20 @@
+# Statistics deltas are upserted in ascending key order, so concurrent writers lock the
+# subject_grade_stats and student_grade_stats rows in the same order.
+import re
+
+from sqlalchemy.dialects import mysql
+
+from app import stats
+
+
+# key of every row of a multi-row stats upsert, in statement order
+def _row_keys(stmt):
+    sql = str(stmt.compile(dialect=mysql.dialect(), compile_kwargs={"literal_binds": True}))
+    return [int(key) for key in re.findall(r"\((\d+), ", sql.split("VALUES", 1)[1])]
+
+
+def test_stats_upserts_are_sorted_by_key():
+    changes = [(9, 3, None, "A"), (2, 7, None, "B"), (5, 1, "C", "A"), (2, 3, None, "F")]
+    subjects, students = stats.stats_statements("mysql", changes)
+    assert _row_keys(subjects) == [1, 3, 7]
+    assert _row_keys(students) == [2, 5, 9]
@@ -9,7 +9,11 @@ CREATE TABLE users (
     full_name VARCHAR(100) NOT NULL,
     email VARCHAR(100) UNIQUE NOT NULL,
     role ENUM('admin', 'teacher', 'student') NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- keyset pagination of users/students filtered by role, ordered by user_id
+    INDEX idx_users_role_user_id (role, user_id),
+    -- full name prefix search
+    INDEX idx_users_full_name (full_name)
 );
 
 -- Subjects table
@@ -31,6 +35,78 @@ CREATE TABLE grades (
     UNIQUE KEY unique_student_subject (student_id, subject_id)
 );
 
+-- Precomputed grade statistics, maintained by the API on every grade change.
+-- Rebuild from the grades table with: python -m app.stats rebuild
+CREATE TABLE subject_grade_stats (
+    subject_id INT PRIMARY KEY,
+    count_a INT NOT NULL DEFAULT 0,
+    count_b INT NOT NULL DEFAULT 0,
+    count_c INT NOT NULL DEFAULT 0,
+    count_d INT NOT NULL DEFAULT 0,
+    count_e INT NOT NULL DEFAULT 0,
+    count_f INT NOT NULL DEFAULT 0,
+    graded_count INT NOT NULL DEFAULT 0,
+    points_total INT NOT NULL DEFAULT 0,
+    FOREIGN KEY (subject_id) REFERENCES subjects(subject_id) ON DELETE CASCADE
+);
+
+CREATE TABLE student_grade_stats (
+    student_id INT PRIMARY KEY,
+    count_a INT NOT NULL DEFAULT 0,
+    count_b INT NOT NULL DEFAULT 0,
+    count_c INT NOT NULL DEFAULT 0,
+    count_d INT NOT NULL DEFAULT 0,
+    count_e INT NOT NULL DEFAULT 0,
+    count_f INT NOT NULL DEFAULT 0,
+    graded_count INT NOT NULL DEFAULT 0,
+    points_total INT NOT NULL DEFAULT 0,
+    FOREIGN KEY (student_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+
+-- Append-only log of grade changes; change_id is the incremental sync cursor.
+-- No foreign keys so the history outlives deleted students and subjects.
+CREATE TABLE grade_changes (
+    change_id INT PRIMARY KEY AUTO_INCREMENT,
+    student_id INT NOT NULL,
+    subject_id INT NOT NULL,
+    grade_value VARCHAR(2),
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_grade_changes_student (student_id, change_id)
+);
+
+-- Last change_id handed out. Writers take their change_ids from this row right before
+-- commit and hold its lock until then, so change_ids become visible in increasing order
+-- and a client's cursor never skips a change committed later.
+CREATE TABLE grade_change_sequence (
+    id INT PRIMARY KEY,
+    last_change_id INT NOT NULL DEFAULT 0
+);
+
+-- continues after any change_ids already logged, so existing databases can run this too
+INSERT INTO grade_change_sequence (id, last_change_id)
+SELECT 1, COALESCE(MAX(change_id), 0) FROM grade_changes;
+
+-- Background jobs for heavy admin operations (subject and user deletion)
+CREATE TABLE jobs (
+    job_id INT PRIMARY KEY AUTO_INCREMENT,
+    kind VARCHAR(32) NOT NULL,
+    target_id INT NOT NULL,
+    status ENUM('queued', 'running', 'done', 'failed') NOT NULL DEFAULT 'queued',
+    processed INT NOT NULL DEFAULT 0,
+    error VARCHAR(255),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP NULL,
+    heartbeat_at TIMESTAMP NULL,
+    finished_at TIMESTAMP NULL,
+    INDEX idx_jobs_status (status, job_id)
+);
+
+-- Existing databases can add the job heartbeat with:
+-- ALTER TABLE jobs ADD COLUMN heartbeat_at TIMESTAMP NULL AFTER started_at;
+
+-- Existing databases can add the user listing indexes with:
+-- ALTER TABLE users ADD INDEX idx_users_role_user_id (role, user_id), ADD INDEX idx_users_full_name (full_name);
+
 -- Insert sample data
 INSERT INTO users (username, password, full_name, email, role) VALUES
 ('admin', 'admin123', 'Admin User', 'admin@school.com', 'admin'),
@@ -53,3 +129,14 @@ INSERT INTO grades (student_id, subject_id, grade_value) VALUES
 (4, 2, 'C'),
 (4, 3, 'D'),
 (4, 4, 'E');
+
+-- Statistics for the sample grades (A=4, B=3, C=2, D=1, E=0, F=0 points)
+INSERT INTO subject_grade_stats (subject_id, count_a, count_b, count_c, count_d, count_e, count_f, graded_count, points_total) VALUES
+(1, 1, 1, 0, 0, 0, 0, 2, 7),
+(2, 1, 0, 1, 0, 0, 0, 2, 6),
+(3, 0, 1, 0, 1, 0, 0, 2, 4),
+(4, 1, 0, 0, 0, 1, 0, 2, 4);
+
+INSERT INTO student_grade_stats (student_id, count_a, count_b, count_c, count_d, count_e, count_f, graded_count, points_total) VALUES
+(3, 3, 1, 0, 0, 0, 0, 4, 15),
+(4, 0, 1, 1, 1, 1, 0, 4, 6);
@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { studentsAPI, subjectsAPI } from '../services/api';
 import GradeEditor from './GradeEditor';
-import { usersAPI } from '../services/api';
+import { usersAPI, jobsAPI } from '../services/api';
 
 function AdminView({ user, onLogout }) {
 
@@ -12,6 +12,9 @@ function AdminView({ user, onLogout }) {
   const [students, setStudents] = useState([]);
   const [subjects, setSubjects] = useState([]);
   const [users, setUsers] = useState([]);
+  // pagination cursors (null when there are no more pages)
+  const [studentsCursor, setStudentsCursor] = useState(null);
+  const [usersCursor, setUsersCursor] = useState(null);
   // New item inputs
   const [newSubject, setNewSubject] = useState('');
   const [newFullName, setNewFullName] = useState('');
@@ -32,10 +35,11 @@ function AdminView({ user, onLogout }) {
   }, [view]);
 
   // api calls to fetch admin management data
-  const loadStudents = async () => {
+  const loadStudents = async (after) => {
     try {
-      const response = await studentsAPI.getAll();
-      setStudents(response.data);
+      const response = await studentsAPI.getAll(after ? { after } : {});
+      setStudents((prev) => (after ? [...prev, ...response.data] : response.data));
+      setStudentsCursor(response.headers['x-next-cursor'] || null);
     } catch (err) {
       console.error(err);
     }
@@ -50,10 +54,11 @@ function AdminView({ user, onLogout }) {
     }
   };
 
-  const loadUsers = async () => {
+  const loadUsers = async (after) => {
     try {
-      const response = await usersAPI.getAll();
-      setUsers(response.data);
+      const response = await usersAPI.getAll(after ? { after } : {});
+      setUsers((prev) => (after ? [...prev, ...response.data] : response.data));
+      setUsersCursor(response.headers['x-next-cursor'] || null);
     } catch (err) {
       console.error(err);
     }
@@ -76,7 +81,10 @@ function AdminView({ user, onLogout }) {
   const handleDeleteSubject = async (subjectId) => {
     if (!window.confirm('Are you sure you want to delete this subject?')) return;
     try {
-      await subjectsAPI.delete(subjectId);
+      // deletion runs as a background job, wait for it before reloading
+      const response = await subjectsAPI.delete(subjectId);
+      const job = await jobsAPI.wait(response.data.job_id);
+      if (job.status === 'failed') throw new Error(job.error);
       loadSubjects();
       alert('Subject deleted successfully!');
     } catch (err) {
@@ -116,7 +124,10 @@ const handleDeleteUser = async (userId) => {
   if (!window.confirm('Are you sure you want to delete this user?')) return;
 
   try {
-    await usersAPI.delete(userId);
+    // deletion runs as a background job, wait for it before reloading
+    const response = await usersAPI.delete(userId);
+    const job = await jobsAPI.wait(response.data.job_id);
+    if (job.status === 'failed') throw new Error(job.error);
     await loadUsers();
     alert('User deleted successfully!');
   } catch (err) {
@@ -222,6 +233,11 @@ if (view === 'users') {
               ))}
             </tbody>
           </table>
+          {usersCursor && (
+            <button className="btn btn-primary" onClick={() => loadUsers(usersCursor)}>
+              Load more
+            </button>
+          )}
         </div>
       </div>
   );
@@ -314,6 +330,11 @@ if (view === 'users') {
               ))}
             </tbody>
           </table>
+          {studentsCursor && (
+            <button className="btn btn-primary" onClick={() => loadStudents(studentsCursor)}>
+              Load more
+            </button>
+          )}
         </div>
       </div>
     );
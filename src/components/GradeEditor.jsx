@@ -36,14 +36,19 @@ function GradeEditor({ student, onBack, onLogout, readOnly }) {
   const handleSave = async () => {
     setSaving(true);
     try {
-      for (const grade of data.grades) {
-        await gradesAPI.updateGrade(
-          student.user_id,
-          grade.subject_id,
-          grade.grade_value
-        );
+      // save the whole sheet in one request and transaction
+      const response = await gradesAPI.bulkUpdate(
+        data.grades.map((grade) => ({
+          student_id: student.user_id,
+          subject_id: grade.subject_id,
+          grade_value: grade.grade_value,
+        }))
+      );
+      if (response.data.failed > 0) {
+        alert(`Saved ${response.data.updated} grades, ${response.data.failed} failed`);
+      } else {
+        alert('Grades saved successfully!');
       }
-      alert('Grades saved successfully!');
     } catch (err) {
       alert('Failed to save grades');
     } finally {
@@ -6,6 +6,8 @@ function TeacherView({onLogout }) {
   const [view, setView] = useState('dashboard');
   const [selectedStudent, setSelectedStudent] = useState(null);
   const [students, setStudents] = useState([]);
+  // pagination cursor (null when there are no more pages)
+  const [studentsCursor, setStudentsCursor] = useState(null);
 
   useEffect(() => {
     if (view === 'students') {
@@ -13,10 +15,11 @@ function TeacherView({onLogout }) {
     }
   }, [view]);
 
-  const loadStudents = async () => {
+  const loadStudents = async (after) => {
     try {
-      const response = await studentsAPI.getAll();
-      setStudents(response.data);
+      const response = await studentsAPI.getAll(after ? { after } : {});
+      setStudents((prev) => (after ? [...prev, ...response.data] : response.data));
+      setStudentsCursor(response.headers['x-next-cursor'] || null);
     } catch (err) {
       console.error(err);
     }
@@ -105,6 +108,11 @@ function TeacherView({onLogout }) {
               ))}
             </tbody>
           </table>
+          {studentsCursor && (
+            <button className="btn btn-primary" onClick={() => loadStudents(studentsCursor)}>
+              Load more
+            </button>
+          )}
         </div>
       </div>
     );
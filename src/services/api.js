@@ -30,8 +30,9 @@ export const authAPI = {
 };
 
 // students API used by admin and teachers to fetch students
+// pages are keyed by user_id, pass the X-Next-Cursor response header as `after` for the next page
 export const studentsAPI = {
-  getAll: () => api.get('/students'),
+  getAll: (params = {}) => api.get('/students', { params }),
 };
 
 // grades API to fetch and update grades used by students, teachers, and admins
@@ -40,6 +41,8 @@ export const gradesAPI = {
   getStudentGrades: (studentId) => api.get(`/grades/student/${studentId}`),
   updateGrade: (studentId, subjectId, gradeValue) =>
     api.put(`/grades/student/${studentId}/subject/${subjectId}`, { grade_value: gradeValue }),
+  // grades: array of { student_id, subject_id, grade_value }
+  bulkUpdate: (grades) => api.put('/grades/bulk', { grades }),
 };
 
 // subjects API used to manage subjects by admin
@@ -52,8 +55,28 @@ export const subjectsAPI = {
 // users API used by admin to manage users and send requests to backend
 export const usersAPI = {
   create: (userData) => api.post('/users', userData),
-  getAll: () => api.get('/users'),
+  getAll: (params = {}) => api.get('/users', { params }),
   delete: (userId) => api.delete(`/users/${userId}`),
 };
 
+// jobs API used by admin to follow background jobs (subject and user deletion)
+export const jobsAPI = {
+  get: (jobId) => api.get(`/jobs/${jobId}`),
+  // poll until the job is done or failed, resolving with the final job; rejects after
+  // timeoutMs so a job that never finishes does not leave the caller waiting forever
+  wait: async (jobId, intervalMs = 500, timeoutMs = 10 * 60 * 1000) => {
+    const deadline = Date.now() + timeoutMs;
+    for (;;) {
+      const response = await api.get(`/jobs/${jobId}`);
+      if (response.data.status === 'done' || response.data.status === 'failed') {
+        return response.data;
+      }
+      if (Date.now() + intervalMs > deadline) {
+        throw new Error(`Job ${jobId} is still ${response.data.status}, check again later`);
+      }
+      await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
+  },
+};
+
 export default api;
\ No newline at end of file